@@ -0,0 +1,71 @@
+"""Micro-benchmark of the hot view calls: web3's ContractFunction encoding and eth-abi decoding
+against the precompiled CallDescriptors. Runs offline on synthetic return data.
+
+    python -m bench.call_descriptors [iterations]
+"""
+import sys
+import time
+
+from eth_abi import encode_abi
+from web3 import Web3
+from web3._utils.abi import get_abi_output_types
+
+from contract.fund import Fund, RebalanceTarget
+from contract.perpetual import MarginAccount, Perpetual
+
+
+ACCOUNT = Web3.toChecksumAddress('0x' + 'ab' * 20)
+
+# contract class, function, args, return data, wrapper of the decoded value
+CASES = [
+    (Perpetual, 'markPrice', (), encode_abi(['uint256'], [400 * 10 ** 18]), None),
+    (Perpetual, 'availableMargin', (ACCOUNT,), encode_abi(['int256'], [-5 * 10 ** 18]), None),
+    (Perpetual, 'isSafe', (ACCOUNT,), encode_abi(['bool'], [True]), None),
+    (Perpetual, 'getMarginAccount', (ACCOUNT,),
+     encode_abi(['(uint8,uint256,uint256,int256,int256,int256)'], [(2, 10 ** 22, 10 ** 21, 0, -10 ** 17, 10 ** 20)]),
+     (lambda values: MarginAccount(*values), MarginAccount.from_call)),
+    (Fund, 'rebalanceTarget', (), encode_abi(['bool', 'uint256', 'uint8'], [True, 10 ** 21, 2]),
+     (lambda values: RebalanceTarget(*values), RebalanceTarget.from_call)),
+    (Fund, 'redeemingBalance', (ACCOUNT,), encode_abi(['uint256'], [10 ** 19]), None),
+    (Fund, 'state', (), encode_abi(['uint8'], [0]), None),
+]
+
+
+def _generic(contract, function: str, args: tuple, data: bytes, wrap):
+    contract_function = getattr(contract.functions, function)(*args)
+    contract.encodeABI(fn_name=function, args=list(args))
+    result = contract.web3.codec.decode_abi(get_abi_output_types(contract_function.abi), data)
+    value = result[0] if len(result) == 1 else result
+    return wrap(value) if wrap is not None else value
+
+
+def _descriptor(descriptor, args: tuple, data: bytes, wrap):
+    descriptor.encode(args)
+    value = descriptor.decode(data)
+    return wrap(value) if wrap is not None else value
+
+
+def _time(fn, iterations: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return time.perf_counter() - started_at
+
+
+def main(iterations: int):
+    web3 = Web3()
+    print(f"{'function':<20}{'web3 us/call':>14}{'descriptor us/call':>20}{'speedup':>10}")
+    for cls, function, args, data, wraps in CASES:
+        contract = web3.eth.contract(address=ACCOUNT, abi=cls.abi)
+        descriptor = cls.descriptor(function)
+        generic_wrap, fast_wrap = wraps if wraps is not None else (None, None)
+        expected = _generic(contract, function, args, data, None)
+        assert descriptor.decode(data) == expected, f"{function} decodes {descriptor.decode(data)} != {expected}"
+
+        generic = _time(lambda: _generic(contract, function, args, data, generic_wrap), iterations)
+        fast = _time(lambda: _descriptor(descriptor, args, data, fast_wrap), iterations)
+        print(f"{function:<20}{generic / iterations * 1e6:>14.1f}{fast / iterations * 1e6:>20.1f}{generic / fast:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
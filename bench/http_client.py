@@ -0,0 +1,78 @@
+"""Benchmark of the pooled HttpClient against the module-level requests calls it replaced, on a
+local keep-alive stand-in server answering a small JSON body. Reports requests per second and
+p50/p99 latency for the same number of requests from the same number of threads.
+
+    python -m bench.http_client [requests] [threads]
+"""
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from lib.http_client import HttpClient
+
+
+BODY = b'{"status":"OK","data":{"lastIndex":"400.12"}}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes, without this delayed ACKs stall keep-alive clients
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _run(name: str, call, count: int, threads: int):
+    latencies = []
+    lock = threading.Lock()
+
+    def one(_):
+        started_at = time.perf_counter()
+        call().json()
+        elapsed = time.perf_counter() - started_at
+        with lock:
+            latencies.append(elapsed)
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(one, range(count)))
+    elapsed = time.perf_counter() - started_at
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    print(f"{name:<18}{count / elapsed:>10.0f}{p50:>10.2f}{p99:>10.2f}")
+
+
+def main(count: int, threads: int):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/markets/ETHPERP/status"
+    client = HttpClient(pool_size=threads, max_concurrency=threads)
+
+    print(f"{'client':<18}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    _run("requests.get", lambda: requests.get(url, timeout=5), count, threads)
+    _run("HttpClient.get", lambda: client.get(url, timeout=5), count, threads)
+    _run("requests.post", lambda: requests.post(url, json={"query": "{}"}, timeout=5), count, threads)
+    _run("HttpClient.post", lambda: client.post(url, json={"query": "{}"}, timeout=5), count, threads)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 8)
@@ -0,0 +1,161 @@
+"""Benchmark of the keeper's active-orders check against a local mock exchange: the signed REST
+round trip of Mcdex.get_active_orders, the MarketData read from memory, and how long an order
+change pushed on the socket takes to show up locally. The mock serves the REST snapshot routes
+and the order book socket, so the same run also exercises the stream/snapshot merge.
+
+    python -m bench.market_data [iterations]
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import websockets
+
+from mcdex import Mcdex, MarketData
+
+
+class MockExchange:
+    """REST routes for the order snapshot, the market status, building, placing and cancelling
+    orders, plus a socket pushing `orderChange`. Every REST answer is held back `latency` seconds."""
+
+    def __init__(self, latency: float = 0):
+        self.orders = {}
+        self.latency = latency
+        self._next_id = 0
+        self._id_lock = threading.Lock()
+        self.index_price = "400.12"
+        self._clients = set()
+        exchange = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path.startswith("/orders"):
+                    self._reply({"orders": [order for order in exchange.orders.values() if order["status"] == "pending"]})
+                else:
+                    self._reply({"lastIndex": exchange.index_price})
+
+            def do_POST(self):
+                params = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                if self.path == "/orders/build":
+                    self._reply({"order": exchange.build(params)})
+                else:
+                    exchange.change({**exchange.orders[params["orderID"]], "status": "pending"})
+                    self._reply({})
+
+            def do_DELETE(self):
+                if self.path.startswith("/orders?"):
+                    order_ids = [order["id"] for order in exchange.orders.values() if order["status"] == "pending"]
+                else:
+                    order_ids = [self.path.rsplit("/", 1)[-1]]
+                for order_id in order_ids:
+                    exchange.change({**exchange.orders[order_id], "status": "canceled"})
+                self._reply({})
+
+            def _reply(self, data: dict):
+                time.sleep(exchange.latency)
+                body = json.dumps({"status": 0, "data": data}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._http.daemon_threads = True
+        threading.Thread(target=self._http.serve_forever, daemon=True).start()
+        self.api_url = f"http://127.0.0.1:{self._http.server_port}"
+
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def serve():
+            asyncio.set_event_loop(self._loop)
+            self._ws = self._loop.run_until_complete(websockets.serve(self._serve, "127.0.0.1", 0))
+            started.set()
+            self._loop.run_forever()
+        threading.Thread(target=serve, daemon=True).start()
+        started.wait()
+        self.ws_url = f"ws://127.0.0.1:{self._ws.sockets[0].getsockname()[1]}"
+
+    async def _serve(self, ws, path):
+        await ws.recv()
+        self._clients.add(ws)
+        try:
+            await ws.wait_closed()
+        finally:
+            self._clients.discard(ws)
+
+    def build(self, params: dict) -> dict:
+        with self._id_lock:
+            self._next_id += 1
+            order_id = f"0x{self._next_id:064x}"
+        order = {"id": order_id, "status": "unsigned", "amount": params["amount"], "availableAmount": params["amount"],
+                 "side": params["side"], "price": params["price"]}
+        self.orders[order_id] = order
+        return order
+
+    def change(self, order: dict):
+        self.orders[order["id"]] = order
+        message = json.dumps({"type": "orderChange", "order": order})
+        for ws in list(self._clients):
+            asyncio.run_coroutine_threadsafe(ws.send(message), self._loop)
+
+    def shutdown(self):
+        self._http.shutdown()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def main(iterations: int):
+    exchange = MockExchange()
+    for i in range(5):
+        exchange.change({"id": f"0x{i:064x}", "status": "pending", "amount": "10"})
+
+    mcdex = Mcdex(exchange.api_url, "ETHPERP", auth_ttl=30)
+    mcdex.set_wallet("0x" + os.urandom(32).hex(), "0x" + "00" * 20)
+    market_data = MarketData(mcdex, exchange.ws_url, snapshot_interval=5)
+    market_data.start()
+    while not market_data.streaming:
+        time.sleep(0.01)
+    assert len(market_data.active_orders()) == len(mcdex.get_active_orders()) == 5
+
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        mcdex.get_active_orders()
+    rest = (time.perf_counter() - started_at) / iterations
+
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        market_data.active_orders()
+    local = (time.perf_counter() - started_at) / iterations
+
+    delays = []
+    for i in range(min(iterations, 200)):
+        order_id = f"0x{i % 5:064x}"
+        status = "full_filled" if i % 2 == 0 else "pending"
+        started_at = time.perf_counter()
+        exchange.change({"id": order_id, "status": status, "amount": "10"})
+        while (market_data.order(order_id) or {}).get("status") != status:
+            time.sleep(0.0001)
+        delays.append(time.perf_counter() - started_at)
+    delays.sort()
+
+    print(f"{'active orders check':<28}{'ms':>10}")
+    print(f"{'REST get_active_orders':<28}{rest * 1000:>10.3f}")
+    print(f"{'MarketData.active_orders':<28}{local * 1000:>10.4f}")
+    print(f"{'socket delta to local p50':<28}{delays[len(delays) // 2] * 1000:>10.3f}")
+    market_data.stop()
+    exchange.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
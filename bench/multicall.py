@@ -0,0 +1,90 @@
+"""Benchmark of the per-block view reads of the keeper's syncers on a stub JSON-RPC node that holds
+every request back a fixed latency. Each block runs Keeper._prefetch_block_views and then reads the
+six views the way `_check_balance` and `_check_redeeming_accounts` do, pinned to the block. The
+serial path skips the prefetch so every read is its own eth_call, the aggregator path prefetches
+through a Multicall contract and the batch path through a JSON-RPC batch. Reports the requests
+and eth_calls each path makes per block and the time per block.
+
+Keeper imports `config`, so run it with the example config on the path:
+
+    PYTHONPATH=config.example python -m bench.multicall [blocks] [latency ms]
+"""
+import logging
+import sys
+import time
+from types import SimpleNamespace
+
+from eth_abi import decode_abi, encode_abi
+from eth_utils import function_signature_to_4byte_selector
+from web3 import HTTPProvider, Web3
+
+from contract.fund import Fund
+from contract.perpetual import Perpetual
+from keeper.keeper import Keeper
+from lib.address import Address
+from lib.contract import block_cache
+from lib.multicall import Multicall
+
+from .stub_node import StubNode
+
+
+MULTICALL_ADDRESS = Address("0x" + "33" * 20)
+# six zero words decode as every prefetched view: false/0 words, FLAT/Normal enums and an empty string
+_RETURN_DATA = bytes(6 * 32)
+
+
+def _eth_call(params) -> str:
+    transaction = params[0]
+    data = bytes.fromhex(transaction["data"][2:])
+    if Address(transaction["to"]) == MULTICALL_ADDRESS and data[:4] == function_signature_to_4byte_selector('aggregate((address,bytes)[])'):
+        calls, = decode_abi(['(address,bytes)[]'], data[4:])
+        return "0x" + encode_abi(['uint256', 'bytes[]'], [int(params[1], 16), [_RETURN_DATA] * len(calls)]).hex()
+    return "0x" + _RETURN_DATA.hex()
+
+
+def _read(keeper):
+    # what the two syncers read on every block
+    keeper.fund.rebalanceTarget()
+    keeper.fund.state()
+    keeper.fund._call('description')
+    keeper.fund.total_supply()
+    keeper.perp.markPrice()
+    keeper.perp.getMarginAccount(keeper.fund.address)
+
+
+def _run(name: str, node: StubNode, keeper, count: int):
+    node.reset()
+    started_at = time.perf_counter()
+    for block_number in range(1000, 1000 + count):
+        block_cache.new_block(block_number)
+        block_cache.pin(block_number)
+        if keeper.multicall is not None:
+            Keeper._prefetch_block_views(keeper)
+        _read(keeper)
+    block_cache.unpin()
+    elapsed = (time.perf_counter() - started_at) / count
+    print(f"{name:<14}{node.http_requests / count:>14.1f}{node.calls['eth_call'] / count:>12.1f}{elapsed * 1000:>12.2f}")
+
+
+def main(count: int, latency: float):
+    node = StubNode({"eth_call": _eth_call}, latency=latency)
+    web3 = Web3(HTTPProvider(node.url))
+    fund = Fund(web3, Address("0x" + "11" * 20))
+    perp = Perpetual(web3, Address("0x" + "22" * 20))
+
+    def keeper(multicall):
+        return SimpleNamespace(fund=fund, perp=perp, multicall=multicall, logger=logging.getLogger())
+
+    aggregator = Multicall(web3, MULTICALL_ADDRESS)
+    # the code check runs once at startup, not per block
+    aggregator.aggregator_available()
+
+    print(f"{'path':<14}{'requests/block':>14}{'calls/block':>12}{'ms/block':>12}")
+    _run("serial", node, keeper(None), count)
+    _run("aggregator", node, keeper(aggregator), count)
+    _run("batch", node, keeper(Multicall(web3)), count)
+    node.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, (float(sys.argv[2]) if len(sys.argv) > 2 else 2) / 1000)
@@ -0,0 +1,57 @@
+"""Benchmark of closing a large position on the mock exchange of bench.market_data, which holds
+every REST answer back a fixed latency: one place_order per child in sequence, as the keeper did,
+against OrderExecutor pipelining build, sign and submit across its workers, then one bulk cancel.
+
+    python -m bench.order_execution [children] [latency ms]
+"""
+import os
+import sys
+import time
+
+from lib.http_client import HttpClient
+from mcdex import Mcdex, MarketData, OrderExecutor, OrderState
+
+from .market_data import MockExchange
+
+
+def main(children: int, latency: float):
+    exchange = MockExchange(latency=latency)
+    # enough pooled connections that the client is not what bounds the executor
+    mcdex = Mcdex(exchange.api_url, "ETHPERP", HttpClient(pool_size=16, max_concurrency=16), auth_ttl=30)
+    mcdex.set_wallet("0x" + os.urandom(32).hex(), "0x" + "00" * 20)
+    market_data = MarketData(mcdex, exchange.ws_url, snapshot_interval=5)
+    market_data.start()
+    while not market_data.streaming:
+        time.sleep(0.01)
+
+    lot_size, child_size = 10, 100
+    amount = children * child_size
+
+    started_at = time.perf_counter()
+    for _ in range(children):
+        mcdex.place_order(str(child_size), "market", "0", "sell", 300, "5")
+    sequential = time.perf_counter() - started_at
+    mcdex.cancel_all_orders()
+
+    print(f"{'close of ' + str(children) + ' children':<28}{'seconds':>10}")
+    print(f"{'sequential place_order':<28}{sequential:>10.3f}")
+    for concurrency in (4, 8, 16):
+        executor = OrderExecutor(mcdex, market_data, lot_size, child_size, concurrency)
+        started_at = time.perf_counter()
+        orders = executor.execute(amount, "sell")
+        elapsed = time.perf_counter() - started_at
+        assert all(order.state == OrderState.OPEN for order in orders) and sum(order.amount for order in orders) == amount
+
+        started_at = time.perf_counter()
+        canceled = executor.cancel()
+        cancel_elapsed = time.perf_counter() - started_at
+        assert len(canceled) == children
+        print(f"{f'OrderExecutor x{concurrency}':<28}{elapsed:>10.3f}")
+        print(f"{f'  bulk cancel x{concurrency}':<28}{cancel_elapsed:>10.3f}")
+
+    market_data.stop()
+    exchange.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 32, (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000)
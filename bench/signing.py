@@ -0,0 +1,56 @@
+"""Micro-benchmark of MAI signing: signatures per second when the coincurve key is rebuilt from the
+raw bytes on every call (the previous EthPersonalSign.signHash), with the key kept alive, and through
+sign_many, plus authentication headers per second with and without the reuse window.
+
+    python -m bench.signing [iterations]
+"""
+import os
+import sys
+import time
+
+import coincurve
+
+from mcdex import Mcdex
+from mcdex.eth_personal_sign import defunct_hash_message
+from mcdex.wallet import Wallet
+
+
+def _rate(fn, iterations: int) -> float:
+    started_at = time.perf_counter()
+    fn(iterations)
+    return iterations / (time.perf_counter() - started_at)
+
+
+def main(iterations: int):
+    private_key = "0x" + os.urandom(32).hex()
+    wallet = Wallet(private_key, "0x" + "00" * 20)
+    raw_key = bytes.fromhex(private_key[2:])
+    order_ids = ["0x" + os.urandom(32).hex() for _ in range(iterations)]
+
+    def rebuilt_key(n):
+        for order_id in order_ids[:n]:
+            coincurve.PrivateKey(raw_key).sign_recoverable(defunct_hash_message(hexstr=order_id), hasher=None)
+
+    def kept_key(n):
+        for order_id in order_ids[:n]:
+            wallet.sign_hash(hexstr=order_id)
+
+    def batch(n):
+        wallet.sign_many(order_ids[:n])
+
+    assert wallet.sign_many(order_ids[:3]) == [wallet.sign_hash(hexstr=order_id) for order_id in order_ids[:3]]
+
+    print(f"{'path':<32}{'per second':>12}")
+    print(f"{'signHash, key rebuilt per call':<32}{_rate(rebuilt_key, iterations):>12.0f}")
+    print(f"{'sign_hash, key kept':<32}{_rate(kept_key, iterations):>12.0f}")
+    print(f"{'sign_many':<32}{_rate(batch, iterations):>12.0f}")
+
+    for auth_ttl in (0, 30):
+        mcdex = Mcdex("http://127.0.0.1", "ETHPERP", auth_ttl=auth_ttl)
+        mcdex.set_wallet(private_key, "0x" + "00" * 20)
+        rate = _rate(lambda n: [mcdex.generate_auth_headers() for _ in range(n)], iterations)
+        print(f"{f'auth headers, auth_ttl={auth_ttl}':<32}{rate:>12.0f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,93 @@
+"""Local stand-in for an Ethereum JSON-RPC node, shared by the benchmarks that count round trips.
+
+Answers single and batched requests from a table of per-method handlers, holds every HTTP request
+back `latency` seconds and counts HTTP requests and calls per method."""
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _word(value: int) -> str:
+    return "0x" + value.to_bytes(32, "big").hex()
+
+
+def _block(params) -> dict:
+    return {
+        "number": "0x64", "hash": "0x" + "cd" * 32, "parentHash": "0x" + "ce" * 32, "nonce": "0x" + "00" * 8,
+        "sha3Uncles": "0x" + "00" * 32, "logsBloom": "0x" + "00" * 256, "transactionsRoot": "0x" + "00" * 32,
+        "stateRoot": "0x" + "00" * 32, "receiptsRoot": "0x" + "00" * 32, "miner": "0x" + "00" * 20,
+        "difficulty": "0x1", "totalDifficulty": "0x1", "extraData": "0x", "size": "0x100",
+        "gasLimit": hex(12500000), "gasUsed": "0x0", "timestamp": hex(int(time.time())),
+        "transactions": [], "uncles": [],
+    }
+
+
+DEFAULT_HANDLERS = {
+    "eth_getBlockByNumber": _block,
+    "eth_chainId": lambda params: "0x1",
+    "net_version": lambda params: "1",
+    "eth_blockNumber": lambda params: "0x64",
+    "eth_gasPrice": lambda params: hex(10 ** 10),
+    "eth_getTransactionCount": lambda params: "0x0",
+    "eth_estimateGas": lambda params: hex(46000),
+    "eth_call": lambda params: _word(1),
+    "eth_getCode": lambda params: "0x6080",
+    "eth_sendRawTransaction": lambda params: "0x" + "ab" * 32,
+}
+
+
+class StubNode:
+    def __init__(self, handlers: dict = None, latency: float = 0):
+        self.handlers = {**DEFAULT_HANDLERS, **(handlers or {})}
+        self.latency = latency
+        self.http_requests = 0
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                time.sleep(node.latency)
+                if isinstance(payload, list):
+                    body = [node._answer(request) for request in payload]
+                else:
+                    body = node._answer(payload)
+                with node._lock:
+                    node.http_requests += 1
+                body = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def reset(self):
+        with self._lock:
+            self.http_requests = 0
+            self.calls = Counter()
+
+    def shutdown(self):
+        self._server.shutdown()
+
+    def _answer(self, request: dict) -> dict:
+        method = request["method"]
+        with self._lock:
+            self.calls[method] += 1
+        handler = self.handlers.get(method)
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": f"{method} not stubbed"}}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": handler(request["params"])}
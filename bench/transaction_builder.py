@@ -0,0 +1,68 @@
+"""Benchmark of sending a contract transaction through web3's signing middleware, as the keeper did,
+against TransactionBuilder with a warm gas limit cache, with and without the eth_call preflight, on
+a stub JSON-RPC node that holds every request back a fixed latency. Reports the requests each
+path makes per transaction and the time per transaction.
+
+    python -m bench.transaction_builder [transactions] [latency ms]
+"""
+import sys
+import time
+
+from eth_account import Account
+from web3 import HTTPProvider, Web3
+from web3.middleware import construct_sign_and_send_raw_middleware
+
+from contract.token import ERC20Token
+from lib.address import Address
+from lib.transaction import NonceManager, TransactionBuilder
+
+from .stub_node import StubNode
+
+
+def _run(name: str, node: StubNode, send, count: int):
+    node.reset()
+    started_at = time.perf_counter()
+    for _ in range(count):
+        send()
+    elapsed = (time.perf_counter() - started_at) / count
+    methods = ", ".join(f"{method}:{calls / count:g}" for method, calls in sorted(node.calls.items()))
+    print(f"{name:<24}{node.http_requests / count:>10.1f}{elapsed * 1000:>10.2f}  {methods}")
+
+
+def main(count: int, latency: float):
+    node = StubNode(latency=latency)
+    account = Account.create()
+    web3 = Web3(HTTPProvider(node.url))
+    token = ERC20Token(web3, Address("0x" + "11" * 20))
+    approve = token.contract.functions.approve("0x" + "22" * 20, 2 ** 256 - 1)
+    gas_price = 10 ** 10
+
+    middleware_web3 = Web3(HTTPProvider(node.url))
+    middleware_web3.middleware_onion.add(construct_sign_and_send_raw_middleware(account))
+    middleware_approve = ERC20Token(middleware_web3, token.address).contract.functions.approve("0x" + "22" * 20, 2 ** 256 - 1)
+
+    def builder_path(builder: TransactionBuilder, nonce: NonceManager):
+        def send():
+            transaction = builder.build(approve, {'from': account.address, 'gasPrice': gas_price, 'nonce': nonce.reserve()})
+            web3.eth.sendRawTransaction(account.sign_transaction(transaction).rawTransaction)
+        return send
+
+    builders = {}
+    for preflight in (False, True):
+        builder = TransactionBuilder(web3, preflight=preflight)
+        nonce = NonceManager(web3, Address(account.address))
+        # warm: chain id, nonce and one receipt's gas used already known
+        builder.chain_id
+        nonce.reserve()
+        builder.record(builder.encode(approve)[:10], 46000)
+        builders[preflight] = builder_path(builder, nonce)
+
+    print(f"{'path':<24}{'req/tx':>10}{'ms/tx':>10}  calls per tx")
+    _run("web3 middleware", node, lambda: middleware_approve.transact({'from': account.address, 'gasPrice': gas_price}), count)
+    _run("builder", node, builders[False], count)
+    _run("builder + preflight", node, builders[True], count)
+    node.shutdown()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, (float(sys.argv[2]) if len(sys.argv) > 2 else 2) / 1000)
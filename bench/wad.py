@@ -0,0 +1,165 @@
+"""Equivalence check and micro-benchmark of the integer Wad against the Decimal Wad it replaced.
+
+The check draws random operands and compares every operation with the previous implementation,
+kept below as DecimalWad. from_number, add, sub, abs and comparisons are identical for every
+operand. mul, div and int differ by design outside the range the keeper works in: the Decimal
+version computed products and quotients in the default 28-digit context before truncating, so
+once an intermediate has more than 28 significant digits it was rounded there (for div both the
+scaled dividend and the quotient), and int went through a float division, while Wad truncates the
+exact result. The check asserts all of them are
+identical for realistic operands (magnitude below 1e7, at most 4 decimals) and, for large
+operands, that any difference stays within that rounding (relative 5e-28 for mul, 1e-27 for div,
+2^-52 for int, plus one unit for the truncation), and reports how many cases differ.
+
+    python -m bench.wad [cases] [iterations]
+"""
+import random
+import sys
+import operator
+import time
+from decimal import Context, Decimal, ROUND_DOWN
+from functools import total_ordering
+
+from lib.wad import Wad
+
+
+_context = Context(prec=1000, rounding=ROUND_DOWN)
+
+
+@total_ordering
+class DecimalWad:
+    """lib/wad.py as it was before the integer rewrite, without str/repr and min/max"""
+
+    def __init__(self, value):
+        if isinstance(value, DecimalWad):
+            self.value = value.value
+        elif isinstance(value, int):
+            self.value = value
+        else:
+            raise ArithmeticError
+
+    @classmethod
+    def from_number(cls, number):
+        pwr = Decimal(10) ** 18
+        dec = Decimal(str(number)) * pwr
+        return DecimalWad(int(dec.quantize(1, context=_context)))
+
+    def __add__(self, other):
+        if isinstance(other, DecimalWad):
+            return DecimalWad(self.value + other.value)
+        else:
+            raise ArithmeticError
+
+    def __sub__(self, other):
+        if isinstance(other, DecimalWad):
+            return DecimalWad(self.value - other.value)
+        else:
+            raise ArithmeticError
+
+    def __mul__(self, other):
+        if isinstance(other, DecimalWad):
+            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(18))
+            return DecimalWad(int(result.quantize(1, context=_context)))
+        elif isinstance(other, int):
+            return DecimalWad(int((Decimal(self.value) * Decimal(other)).quantize(1, context=_context)))
+        else:
+            raise ArithmeticError
+
+    def __truediv__(self, other):
+        if isinstance(other, DecimalWad):
+            return DecimalWad(int((Decimal(self.value) * (Decimal(10) ** Decimal(18)) / Decimal(other.value)).quantize(1, context=_context)))
+        else:
+            raise ArithmeticError
+
+    def __abs__(self):
+        return DecimalWad(abs(self.value))
+
+    def __eq__(self, other):
+        if isinstance(other, DecimalWad):
+            return self.value == other.value
+        else:
+            raise ArithmeticError
+
+    def __lt__(self, other):
+        if isinstance(other, DecimalWad):
+            return self.value < other.value
+        else:
+            raise ArithmeticError
+
+    def __int__(self):
+        return int(self.value / 10**18)
+
+
+def _realistic(rng: random.Random) -> str:
+    return f"{rng.choice(['', '-'])}{rng.randrange(0, 10 ** 7)}.{rng.randrange(0, 10 ** 4):04d}"
+
+
+def _large(rng: random.Random) -> int:
+    return rng.choice([-1, 1]) * rng.randrange(1, 10 ** rng.randrange(1, 40))
+
+
+def _within_rounding(value: int, baseline: int, exact: float, relative: float = 5e-28) -> bool:
+    return abs(value - baseline) <= abs(exact) * relative + 1
+
+
+def check(cases: int, seed: int = 1):
+    rng = random.Random(seed)
+    for _ in range(cases):
+        a, b = _realistic(rng), _realistic(rng)
+        x, y = Wad.from_number(a), Wad.from_number(b)
+        dx, dy = DecimalWad.from_number(a), DecimalWad.from_number(b)
+        assert x.value == dx.value, a
+        assert (x + y).value == (dx + dy).value and (x - y).value == (dx - dy).value, (a, b)
+        assert (x * y).value == (dx * dy).value, (a, b)
+        if y.value != 0:
+            assert (x / y).value == (dx / dy).value, (a, b)
+        assert (x < y) == (dx < dy) and int(x) == int(dx) and abs(x).value == abs(dx).value, (a, b)
+
+    differ = {'mul': 0, 'div': 0, 'int': 0}
+    for _ in range(cases):
+        a, b = _large(rng), _large(rng)
+        x, y, dx, dy = Wad(a), Wad(b), DecimalWad(a), DecimalWad(b)
+        assert (x + y).value == (dx + dy).value and (x - y).value == (dx - dy).value
+        assert (x < y) == (dx < dy) and abs(x).value == abs(dx).value
+        assert _within_rounding(int(x), int(dx), a / 10 ** 18, 2 ** -52), a
+        differ['int'] += int(x) != int(dx)
+        product, baseline = (x * y).value, (dx * dy).value
+        assert _within_rounding(product, baseline, a * b / 10 ** 18), (a, b)
+        differ['mul'] += product != baseline
+        quotient, baseline = (x / y).value, (dx / dy).value
+        assert _within_rounding(quotient, baseline, a * 10 ** 18 / b, 1e-27), (a, b)
+        differ['div'] += quotient != baseline
+
+    print(f"{cases} realistic cases identical, {cases} large-operand cases within the 28-digit rounding "
+          f"(mul differs in {differ['mul']}, div in {differ['div']}, int in {differ['int']})")
+
+
+def _rate(fn, iterations: int) -> float:
+    started_at = time.perf_counter()
+    fn(iterations)
+    return (time.perf_counter() - started_at) / iterations * 1e9
+
+
+def bench(iterations: int):
+    print(f"{'operation':<14}{'Decimal ns':>12}{'Wad ns':>10}{'speedup':>10}")
+    for name, op in (("from_number", None), ("add", operator.add), ("mul", operator.mul),
+                     ("div", operator.truediv), ("compare", operator.lt)):
+        def run(cls, op=op):
+            if op is None:
+                def loop(n):
+                    for i in range(n):
+                        cls.from_number("400.12" if i & 1 else 0.25)
+            else:
+                x, y = cls(400 * 10 ** 18 + 123), cls(12000 * 10 ** 18 + 7)
+
+                def loop(n):
+                    for _ in range(n):
+                        op(x, y)
+            return loop
+        baseline, current = _rate(run(DecimalWad), iterations), _rate(run(Wad), iterations)
+        print(f"{name:<14}{baseline:>12.0f}{current:>10.0f}{baseline / current:>9.1f}x")
+
+
+if __name__ == '__main__':
+    check(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
+    bench(int(sys.argv[2]) if len(sys.argv) > 2 else 200000)
@@ -2,37 +2,113 @@ import os
 
 # eth node rpc request
 ETH_RPC_URL = os.environ.get('ETH_RPC_URL', 'http://localhost:8545')
+# eth node websocket for newHeads subscription, empty to poll ETH_RPC_URL
+ETH_WS_URL = os.environ.get('ETH_WS_URL', '')
+# http head polling interval bounds when websocket is unavailable(second)
+HEAD_POLL_MIN_INTERVAL = float(os.environ.get('HEAD_POLL_MIN_INTERVAL', 0.25))
+HEAD_POLL_MAX_INTERVAL = float(os.environ.get('HEAD_POLL_MAX_INTERVAL', 2))
 
 # timeout for get transaction receipt(second)
 TX_TIMEOUT = int(os.environ.get('TX_TIMEOUT', 300))
 KEEPER_KEY_FILE = os.environ.get('KEEPER_KEY_FILE', '')
+# max keeper transactions waiting for receipts at once
+TX_MAX_PENDING = int(os.environ.get('TX_MAX_PENDING', 16))
+# pending keeper transactions are replaced every GAS_BUMP_BLOCKS blocks or GAS_BUMP_SECONDS seconds(0 disables either),
+# paying GAS_BUMP_RATE times the previous gas price, at most GAS_PRICE_MAX gwei and GAS_BUMP_MAX_TIMES times
+GAS_BUMP_BLOCKS = int(os.environ.get('GAS_BUMP_BLOCKS', 0))
+GAS_BUMP_SECONDS = float(os.environ.get('GAS_BUMP_SECONDS', 300))
+GAS_BUMP_RATE = float(os.environ.get('GAS_BUMP_RATE', 1.125))
+GAS_BUMP_MAX_TIMES = int(os.environ.get('GAS_BUMP_MAX_TIMES', 10))
+GAS_PRICE_MAX = float(os.environ.get('GAS_PRICE_MAX', 500))
+# gas limit is the max gas used by the last GAS_LIMIT_WINDOW calls of the same function times GAS_LIMIT_MARGIN
+GAS_LIMIT_MARGIN = float(os.environ.get('GAS_LIMIT_MARGIN', 1.25))
+GAS_LIMIT_WINDOW = int(os.environ.get('GAS_LIMIT_WINDOW', 20))
+# eth_call every transaction sent with a cached gas limit first, so one that would revert is never mined,
+# notice, TX_PREFLIGHT must be True or False
+TX_PREFLIGHT = eval(os.environ.get('TX_PREFLIGHT', 'True'))
 
 # gas price
 GAS_LEVEL = os.environ.get('GAS_LEVEL', 'fast')
 ETH_GAS_URL = os.environ.get('ETH_GAS_URL', 'https://ethgasstation.info/api/ethgasAPI.json')
+# gas price refresh interval, and age after which the node's eth_gasPrice is used instead(second)
+GAS_PRICE_TTL = float(os.environ.get('GAS_PRICE_TTL', 15))
+GAS_PRICE_STALE_AFTER = float(os.environ.get('GAS_PRICE_STALE_AFTER', 60))
 
 # contract address
 PERP_ADDRESS = os.environ.get('PERP_ADDRESS', '0x0D1dB4ef31ebe69c4e91BA703A829Ca0Ae49C534')
 AMM_ADDRESS = os.environ.get('AMM_ADDRESS', '0x3ff04fc4aff4ba070cbb2a0cf9603919827ae78a')
 COLLATERAL_TOKEN = os.environ.get('COLLATERAL_TOKEN', '0x0000000000000000000000000000000000000000')
 FUND_ADDRESS = os.environ.get('FUND_ADDRESS', '0xA8cD84eE8aD8eC1c7ee19E578F2825cDe18e56d1')
+# sqlite database for state kept across restarts(pending transactions, redeeming index, gas prices, parsed abis,
+# verified contract code), empty to keep it in memory only. writes are committed every STATE_FLUSH_INTERVAL seconds
+STATE_DB = os.environ.get('STATE_DB', './cache/keeper.db')
+STATE_FLUSH_INTERVAL = float(os.environ.get('STATE_FLUSH_INTERVAL', 1))
+# block syncer worker threads, and seconds a queued syncer run may wait before it is dropped
+SYNCER_WORKERS = int(os.environ.get('SYNCER_WORKERS', 4))
+SYNCER_DEADLINE = float(os.environ.get('SYNCER_DEADLINE', 30))
+
+# multicall aggregator for batched view calls, empty to use json-rpc batch
+MULTICALL_ADDRESS = os.environ.get('MULTICALL_ADDRESS', '0xeefBa1e63905eF1D7ACbA5a8513c70307C1cE441')
+# json-rpc batch size and max concurrent batches for per-account reads
+RPC_BATCH_SIZE = int(os.environ.get('RPC_BATCH_SIZE', 100))
+RPC_BATCH_CONCURRENCY = int(os.environ.get('RPC_BATCH_CONCURRENCY', 4))
+
+# where redeeming accounts come from: 'events' indexes the fund's logs locally, 'graph' queries FUND_GRAPH_URL
+REDEEMING_INDEX = os.environ.get('REDEEMING_INDEX', 'events')
+# first block to index fund events from when there is no checkpoint in STATE_DB
+FUND_START_BLOCK = int(os.environ.get('FUND_START_BLOCK', 0))
+# blocks below the head treated as final by the event index, and accounts checked against the chain at startup
+REDEEMING_INDEX_CONFIRMATIONS = int(os.environ.get('REDEEMING_INDEX_CONFIRMATIONS', 12))
+REDEEMING_INDEX_VALIDATE_SAMPLE = int(os.environ.get('REDEEMING_INDEX_VALIDATE_SAMPLE', 20))
 
 #fund-graph
 FUND_GRAPH_URL = os.environ.get('FUND_GRAPH_URL', 'https://api.thegraph.com/subgraphs/name/mcdexio/mcfund-mainnet')
+# redeeming accounts refresh interval(second) and rows per page, the graph allows at most 1000
+FUND_GRAPH_INTERVAL = float(os.environ.get('FUND_GRAPH_INTERVAL', 15))
+FUND_GRAPH_PAGE_SIZE = int(os.environ.get('FUND_GRAPH_PAGE_SIZE', 1000))
+
+# shared http client for mcdex, the graph and the gas station: keep-alive connections per host,
+# max concurrent requests per host and retries of idempotent requests
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_MAX_CONCURRENCY = int(os.environ.get('HTTP_MAX_CONCURRENCY', 10))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
 
 # mcdex
 MARKET_ID = os.environ.get('MARKET_ID', 'ETHPERP')
 MCDEX_URL = os.environ.get('MCDEX_URL', 'https://mcdex.io/api')
+# seconds a signed mcdex authentication header is reused before signing a new one, 0 signs every request
+MAI_AUTH_TTL = float(os.environ.get('MAI_AUTH_TTL', 30))
+# order book socket pushing the keeper's orders and the index price, empty to read REST snapshots only,
+# and the snapshot interval(second) used without the socket or while it is down
+MCDEX_WS_URL = os.environ.get('MCDEX_WS_URL', '')
+MCDEX_SNAPSHOT_INTERVAL = float(os.environ.get('MCDEX_SNAPSHOT_INTERVAL', 5))
 POSITION_LIMIT = int(os.environ.get('POSITION_LIMIT', 12000))
 LEVERAGE = float(os.environ.get('LEVERAGE', 5))
 # notice, INVERSE must be True or False
 INVERSE = eval(os.environ.get('INVERSE', 'True'))
 LOT_SIZE = int(os.environ.get('LOT_SIZE', 10))
+# orderbook closes are split into child orders of at most ORDER_CHILD_SIZE (a multiple of LOT_SIZE),
+# built, signed and submitted ORDER_CONCURRENCY at a time, keep it within HTTP_MAX_CONCURRENCY
+ORDER_CHILD_SIZE = int(os.environ.get('ORDER_CHILD_SIZE', 2000))
+ORDER_CONCURRENCY = int(os.environ.get('ORDER_CONCURRENCY', 8))
 MIN_LIQUIDATE_SIZE = int(os.environ.get('MIN_LIQUIDATE_SIZE', 1000))
+# closes the keeper's own position on every block, in the AMM or the orderbook, see CLOSE_IN_AMM
+# notice, CLOSE_KEEPER_POSITION must be True or False
+CLOSE_KEEPER_POSITION = eval(os.environ.get('CLOSE_KEEPER_POSITION', 'False'))
 # notice, CLOSE_IN_AMM must be True or False
 CLOSE_IN_AMM = eval(os.environ.get('CLOSE_IN_AMM', 'True'))
 DEADLINE = int(os.environ.get('DEADLINE', 120))
 PRICE_SLIPPAGE = float(os.environ.get('PRICE_SLIPPAGE', 0.01))
+# amm pool state mirrored from events: blocks before a log is final, blocks between full re-reads
+# of the pool, seconds after which the mirror is too old to price from and the allowed drift ratio
+AMM_MIRROR_CONFIRMATIONS = int(os.environ.get('AMM_MIRROR_CONFIRMATIONS', 12))
+AMM_MIRROR_RESYNC_BLOCKS = int(os.environ.get('AMM_MIRROR_RESYNC_BLOCKS', 100))
+AMM_MIRROR_MAX_AGE = float(os.environ.get('AMM_MIRROR_MAX_AGE', 60))
+AMM_MIRROR_TOLERANCE = float(os.environ.get('AMM_MIRROR_TOLERANCE', 0.001))
+
+# local prometheus-style metrics endpoint, 0 to disable
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', 9108))
 
 LOG_CONFIG = {
     "version": 1,
@@ -17,35 +17,31 @@ class AMM(Contract):
         self.contract = self._get_contract(web3, self.abi, address)
 
     def current_fair_price(self, user: Address) -> Wad:
-        return Wad(self.contract.functions.currentFairPrice().call({'from': user.address}))
+        return Wad(self._call('currentFairPrice', transaction={'from': user.address}))
 
     def perpetualProxy(self, user: Address) -> Address:
-        return Address(self.contract.functions.perpetualProxy().call({'from': user.address}))
+        return Address(self._call('perpetualProxy', transaction={'from': user.address}))
 
     def position_size(self) -> Wad:
-        return Wad(self.contract.functions.positionSize().call())
+        return Wad(self._call('positionSize'))
 
     def current_available_margin(self) -> Wad:
-        return Wad(self.contract.functions.currentAvailableMargin().call())
+        return Wad(self._call('currentAvailableMargin'))
 
-    def buy(self, amount: Wad, price: Wad, deadline: int, user: Address, gasPrice: int):
+    def buy(self, amount: Wad, price: Wad, deadline: int, user: Address, gasPrice: int, nonce: int = None):
         assert isinstance(amount, Wad)
         assert isinstance(price, Wad)
         assert isinstance(deadline, int)
 
-        tx_hash = self.contract.functions.buy(amount.value, price.value, deadline).transact({
-                    'from': user.address,
-                    'gasPrice': gasPrice
-                })
+        tx_hash = self._transact(self.contract.functions.buy(amount.value, price.value, deadline),
+                    self._tx_params(user, gasPrice, nonce))
         return tx_hash
 
-    def sell(self, amount: Wad, price: Wad, deadline: int, user: Address, gasPrice: int):
+    def sell(self, amount: Wad, price: Wad, deadline: int, user: Address, gasPrice: int, nonce: int = None):
         assert isinstance(amount, Wad)
         assert isinstance(price, Wad)
         assert isinstance(deadline, int)
 
-        tx_hash = self.contract.functions.sell(amount.value, price.value, deadline).transact({
-                    'from': user.address,
-                    'gasPrice': gasPrice
-                })
+        tx_hash = self._transact(self.contract.functions.sell(amount.value, price.value, deadline),
+                    self._tx_params(user, gasPrice, nonce))
         return tx_hash
\ No newline at end of file
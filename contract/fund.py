@@ -2,6 +2,8 @@ from web3 import Web3
 
 from lib.address import Address
 from lib.contract import Contract
+from lib.http_client import HttpClient
+from lib.multicall import Multicall
 from lib.wad import Wad
 from enum import Enum
 from .perpetual import PositionSide
@@ -21,8 +23,18 @@ class RebalanceTarget():
         self.amount = Wad(amount)
         self.side = PositionSide(side)
 
+    @classmethod
+    def from_call(cls, values: tuple):
+        """Wraps rebalanceTarget return values, already typed by the decoder so the checks are skipped"""
+        target = object.__new__(cls)
+        target.needRebalance = values[0]
+        target.amount = Wad(values[1])
+        target.side = PositionSide(values[2])
+        return target
+
 class Fund(Contract):
     abi = Contract._load_abi(__name__, '../abi/Fund.abi')
+    fast_views = ('rebalanceTarget', 'redeemingBalance', 'state')
 
     def __init__(self, web3: Web3, address: Address):
         assert(isinstance(web3, Web3))
@@ -33,55 +45,54 @@ class Fund(Contract):
         self.contract = self._get_contract(web3, self.abi, address)
 
     def total_supply(self) -> Wad:
-        return Wad(self.contract.functions.totalSupply().call())
+        return Wad(self._call('totalSupply'))
 
     def state(self) -> State:
-        return State(self.contract.functions.state().call())
+        return State(self._call('state'))
 
     def getRebalanceSlippage(self) -> Wad:
-        description = self.contract.functions.description().call()
+        description = self._call('description')
         return Wad(description[2])
 
 
     def rebalanceTarget(self) -> RebalanceTarget:
-       targetRes = self.contract.functions.rebalanceTarget().call()
-       return RebalanceTarget(targetRes[0], targetRes[1], targetRes[2])
+       targetRes = self._call('rebalanceTarget')
+       return RebalanceTarget.from_call(targetRes)
 
-    def rebalance(self, max_amount: Wad, price_limit: Wad, side: int, user: Address, gasPrice: int):
-        tx_hash = self.contract.functions.rebalance(max_amount.value, price_limit.value, side).transact({
-                    'from': user.address,
-                    'gasPrice': gasPrice        
-        })
-        return tx_hash 
+    def rebalance(self, max_amount: Wad, price_limit: Wad, side: int, user: Address, gasPrice: int, nonce: int = None):
+        tx_hash = self._transact(self.contract.functions.rebalance(max_amount.value, price_limit.value, side),
+                    self._tx_params(user, gasPrice, nonce))
+        return tx_hash
 
     def redeemingBalance(self, address: Address) -> Wad:
         assert isinstance(address, Address)
-        return Wad(self.contract.functions.redeemingBalance(address.address).call())
+        return Wad(self._call('redeemingBalance', address.address))
+
+    def redeemingBalances(self, addresses: list, chunk_size: int = 100, max_in_flight: int = 4, http: HttpClient = None) -> dict:
+        """Fetches redeemingBalance for many accounts with chunked JSON-RPC batches, keyed by address"""
+        assert all(isinstance(address, Address) for address in addresses)
 
-    def bidRedeemingShare(self, account: Address, amount: Wad, price_limit: Wad, side: int, user: Address, gasPrice: int):
-        tx_hash = self.contract.functions.bidRedeemingShare(account.address, amount.value, price_limit.value, side).transact({
-                    'from': user.address,
-                    'gasPrice': gasPrice                    
-        })
+        views = [self.view('redeemingBalance', address.address) for address in addresses]
+        balances = Multicall(self.web3, chunk_size=chunk_size, max_in_flight=max_in_flight, http=http).call(views)
+        return {address: Wad(balance) for address, balance in zip(addresses, balances)}
+
+    def bidRedeemingShare(self, account: Address, amount: Wad, price_limit: Wad, side: int, user: Address, gasPrice: int, nonce: int = None):
+        tx_hash = self._transact(self.contract.functions.bidRedeemingShare(account.address, amount.value, price_limit.value, side),
+                    self._tx_params(user, gasPrice, nonce))
         return tx_hash
 
-    def bidSettledShare(self, amount: Wad, price_limit: Wad, side: int, user: Address, gasPrice: int):
-        tx_hash = self.contract.functions.bidSettledShare(amount.value, price_limit.value, side).transact({
-                    'from': user.address,
-                    'gasPrice': gasPrice                        
-        })
+    def bidSettledShare(self, amount: Wad, price_limit: Wad, side: int, user: Address, gasPrice: int, nonce: int = None):
+        tx_hash = self._transact(self.contract.functions.bidSettledShare(amount.value, price_limit.value, side),
+                    self._tx_params(user, gasPrice, nonce))
         return tx_hash
 
     def netAssetValue(self) -> Wad:
-        return Wad(self.contract.functions.netAssetValue().call())
+        return Wad(self._call('netAssetValue'))
 
     def netAssetValuePerShare(self) -> Wad:
-        return Wad(self.contract.functions.netAssetValuePerShare().call())
-
-    def purchase(self, amount: Wad, price: Wad, share: Wad, user: Address, gasPrice: int):
-        tx_hash = self.contract.functions.purchase(amount.value, price.value, share.value).transact({
-                    'value': amount.value,
-                    'from': user.address,
-                    'gasPrice': gasPrice
-                })
+        return Wad(self._call('netAssetValuePerShare'))
+
+    def purchase(self, amount: Wad, price: Wad, share: Wad, user: Address, gasPrice: int, nonce: int = None):
+        tx_hash = self._transact(self.contract.functions.purchase(amount.value, price.value, share.value),
+                    self._tx_params(user, gasPrice, nonce, value=amount.value))
         return tx_hash
@@ -30,6 +30,18 @@ class MarginAccount():
         self.entry_funding_loss = Wad(entry_funding_loss)
         self.cash_balance = Wad(cash_balance)
 
+    @classmethod
+    def from_call(cls, values: tuple):
+        """Wraps getMarginAccount return values, already typed by the decoder so the checks are skipped"""
+        margin_account = object.__new__(cls)
+        margin_account.side = PositionSide(values[0])
+        margin_account.size = Wad(values[1])
+        margin_account.entry_value = Wad(values[2])
+        margin_account.entry_social_loss = Wad(values[3])
+        margin_account.entry_funding_loss = Wad(values[4])
+        margin_account.cash_balance = Wad(values[5])
+        return margin_account
+
 class Liquidate:
     def __init__(self, price: int, amount: int):
         assert(isinstance(price, int))
@@ -40,6 +52,7 @@ class Liquidate:
 
 class Perpetual(Contract):
     abi = Contract._load_abi(__name__, '../abi/Perpetual.abi')
+    fast_views = ('markPrice', 'getMarginAccount', 'availableMargin', 'isSafe')
 
     def __init__(self, web3: Web3, address: Address):
         assert(isinstance(web3, Web3))
@@ -50,28 +63,28 @@ class Perpetual(Contract):
         self.contract = self._get_contract(web3, self.abi, address)
 
     def total_accounts(self) -> int:
-        return self.contract.functions.totalAccounts().call()
+        return self._call('totalAccounts')
 
     def status(self) -> Status:
-        return Status(self.contract.functions.status().call())
+        return Status(self._call('status'))
 
     def accounts(self, account_id: int) -> Address:
-        return Address(self.contract.functions.accountList(account_id).call())
+        return Address(self._call('accountList', account_id))
 
     def markPrice(self) -> Wad:
-        return Wad(self.contract.functions.markPrice().call())
+        return Wad(self._call('markPrice'))
 
     def getAvailableMargin(self, address: Address) -> Wad:
-        availableMargin = self.contract.functions.availableMargin(address.address).call()
+        availableMargin = self._call('availableMargin', address.address)
         return Wad(availableMargin)
 
     def getMarginAccount(self, address: Address) -> MarginAccount:
-        margin_account = self.contract.functions.getMarginAccount(address.address).call()
-        return MarginAccount(margin_account[0], margin_account[1], margin_account[2], margin_account[3], margin_account[4], margin_account[5])
+        margin_account = self._call('getMarginAccount', address.address)
+        return MarginAccount.from_call(margin_account)
 
     def is_safe(self, address: Address) -> bool:
         assert isinstance(address, Address)
-        return self.contract.functions.isSafe(address.address).call()
+        return self._call('isSafe', address.address)
 
     def depositEther(self, amount: int, user: Address, gasPrice: int):
         self.logger.info(self.web3.toWei(amount, 'ether'))
@@ -81,7 +94,7 @@ class Perpetual(Contract):
                 'value': self.web3.toHex(amount_towei),
                 'gasPrice': gasPrice
         })
-        tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash)
+        tx_receipt = self._wait_receipt(tx_hash)
         #self.logger.info(tx_receipt)
         return tx_receipt
 
@@ -90,12 +103,12 @@ class Perpetual(Contract):
         tx_hash = self.contract.functions.deposit(amount.value).transact({'from': user.address,
                     'gasPrice': gasPrice
                 })
-        tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash)
+        tx_receipt = self._wait_receipt(tx_hash)
         #self.logger.info(tx_receipt)
         return tx_receipt
 
     def calculateLiquidateAmount(self, guy: Address, price: Wad) -> Wad:
-        return Wad(self.contract.functions.calculateLiquidateAmount(guy.address, price.value).call())
+        return Wad(self._call('calculateLiquidateAmount', guy.address, price.value))
 
     def liquidate(self, guy: Address, amount: Wad, user: Address, gasPrice: int):
         assert isinstance(amount, Wad)
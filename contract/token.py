@@ -18,25 +18,25 @@ class ERC20Token(Contract):
         self.contract = self._get_contract(web3, self.abi, address)
 
     def total_supply(self) -> Wad:
-        return Wad(self.contract.functions.totalSupply().call())
+        return Wad(self._call('totalSupply'))
 
     def balance_of(self, address: Address) -> Wad:
         assert(isinstance(address, Address))
 
-        return Wad(self.contract.functions.balanceOf(address.address).call())
+        return Wad(self._call('balanceOf', address.address))
 
     def allowance(self, address: Address, guy: Address) -> Wad:
         assert(isinstance(address, Address))
         assert(isinstance(guy, Address))
 
-        return Wad(self.contract.functions.allowance(address.address, guy.address).call())
+        return Wad(self._call('allowance', address.address, guy.address))
 
     def transfer(self, address: Address, value: Wad, user: Address):
         assert(isinstance(address, Address))
         assert(isinstance(value, Wad))
 
         tx_hash = self.contract.functions.transfer(address.address, value.value).transact({'from': user.address})
-        tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash)
+        tx_receipt = self._wait_receipt(tx_hash)
         #self.logger.info(tx_receipt)
         return tx_receipt
 
@@ -46,7 +46,7 @@ class ERC20Token(Contract):
         assert(isinstance(value, Wad))
 
         tx_hash = self.contract.functions.transferFrom(from_address.address, to_address.address, value.value).transact()
-        tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash)
+        tx_receipt = self._wait_receipt(tx_hash)
         #self.logger.info(tx_receipt)
         return tx_receipt
 
@@ -54,6 +54,6 @@ class ERC20Token(Contract):
         assert(isinstance(address, Address))
         assert(isinstance(limit, Wad))
         tx_hash = self.contract.functions.approve(address.address, limit.value).transact({'from': user.address})
-        tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash)
+        tx_receipt = self._wait_receipt(tx_hash)
         #self.logger.info(tx_receipt)
         return tx_receipt
\ No newline at end of file
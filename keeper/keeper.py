@@ -1,10 +1,12 @@
 import logging
 import logging.config
+import os
 import time
 import json
 import requests
 import threading
 import math
+from concurrent.futures import ThreadPoolExecutor
 
 from web3 import Web3, HTTPProvider, middleware
 import eth_utils
@@ -13,73 +15,120 @@ from eth_account import Account
 from web3.middleware import construct_sign_and_send_raw_middleware, geth_poa_middleware
 
 import config
+from lib import metrics
 from lib.address import Address
+from lib.amm_mirror import AMMMirror
+from lib.contract import Contract, block_cache, use_startup_cache
+from lib.gas import GasPriceOracle
+from lib.http_client import HttpClient
+from lib.multicall import Multicall
+from lib.receipt import ReceiptTracker
+from lib.redeeming import EventRedeemingIndex, GraphRedeemingIndex
+from lib.transaction import GasSchedule, PipelineFull, TransactionBuilder, TransactionPipeline
 from lib.wad import Wad
-from mcdex import Mcdex
+from mcdex import Mcdex, MarketData, OrderExecutor, OrderState
 from watcher import Watcher
 from contract.amm import AMM
 from contract.perpetual import Perpetual, PositionSide, Status
 from contract.token import ERC20Token
 from contract.fund import Fund, State
-from .computation import compute_AMM_price
+from .computation import compute_AMM_price, compute_AMM_price_from_state
+from .persistence import StateStore
 
 class Keeper:
     logger = logging.getLogger()
 
+    ZERO_ADDRESS = Address('0x0000000000000000000000000000000000000000')
+
     def __init__(self, args: list, **kwargs):
+        self.started_at = time.monotonic()
+        self._first_head_seen = False
         logging.config.dictConfig(config.LOG_CONFIG)
+        self.store = None
+        if config.STATE_DB:
+            os.makedirs(os.path.dirname(config.STATE_DB) or '.', exist_ok=True)
+            self.store = StateStore(config.STATE_DB, config.STATE_FLUSH_INTERVAL)
+            self.store.start()
+            use_startup_cache(self.store.namespace('startup'))
+            self.logger.info(f"state restored from {config.STATE_DB}, last processed block:{self.store.get('keeper', 'last_block')}")
         self.keeper_account = None
         self.keeper_account_key = ""
+        self.pipeline = None
+        # transaction purpose -> future of its pending transaction, at most one per purpose
+        self._in_flight = {}
         self.web3 = Web3(HTTPProvider(endpoint_uri=config.ETH_RPC_URL))
         self.web3.middleware_onion.inject(geth_poa_middleware, layer=0)
+        self.web3.middleware_onion.add(metrics.rpc_counter_middleware)
         self.gas_price = self.web3.toWei(10, "gwei")
+        self.http = HttpClient(config.HTTP_POOL_SIZE, config.HTTP_MAX_CONCURRENCY, config.HTTP_RETRIES)
+        self.gas_oracle = GasPriceOracle(self.web3, config.ETH_GAS_URL, config.GAS_LEVEL, config.GAS_PRICE_TTL, config.GAS_PRICE_STALE_AFTER,
+                                         history=self.store.series('gas_price') if self.store else None, http=self.http)
 
         # contract 
         self.perp = Perpetual(web3=self.web3, address=Address(config.PERP_ADDRESS))
         self.token = ERC20Token(web3=self.web3, address=Address(config.COLLATERAL_TOKEN))
         self.AMM = AMM(web3=self.web3, address=Address(config.AMM_ADDRESS))
         self.fund = Fund(web3=self.web3, address=Address(config.FUND_ADDRESS))
+        # ether collateral has no token contract to verify
+        contracts = [self.perp, self.AMM, self.fund] + ([self.token] if self.token.address != self.ZERO_ADDRESS else [])
+        Contract.verify(self.web3, contracts)
+        self.receipts = ReceiptTracker(self.web3)
+        for contract in (self.perp, self.token, self.AMM, self.fund):
+            contract.receipts = self.receipts
+        if config.REDEEMING_INDEX == 'graph':
+            self.redeeming_index = GraphRedeemingIndex(config.FUND_GRAPH_URL, self.fund.address, config.FUND_GRAPH_INTERVAL,
+                                                       config.FUND_GRAPH_PAGE_SIZE, http=self.http)
+        else:
+            self.redeeming_index = EventRedeemingIndex(self.fund, config.FUND_START_BLOCK,
+                                                       self.store.namespace('redeeming') if self.store else None,
+                                                       config.REDEEMING_INDEX_CONFIRMATIONS)
+        self.multicall = Multicall(self.web3, Address(config.MULTICALL_ADDRESS) if config.MULTICALL_ADDRESS else None, http=self.http)
+        self.amm_mirror = AMMMirror(self.AMM, self.perp, self.multicall, config.AMM_MIRROR_CONFIRMATIONS,
+                                    config.AMM_MIRROR_RESYNC_BLOCKS, config.AMM_MIRROR_TOLERANCE, http=self.http)
 
         # mcdex for orderbook
-        self.mcdex = Mcdex(config.MCDEX_URL, config.MARKET_ID)
+        self.mcdex = Mcdex(config.MCDEX_URL, config.MARKET_ID, self.http, config.MAI_AUTH_TTL)
+        self.market_data = MarketData(self.mcdex, config.MCDEX_WS_URL, config.MCDEX_SNAPSHOT_INTERVAL)
+        self.order_executor = OrderExecutor(self.mcdex, self.market_data, config.LOT_SIZE, config.ORDER_CHILD_SIZE,
+                                            config.ORDER_CONCURRENCY, 300, str(config.LEVERAGE))
 
         # watcher
-        self.watcher = Watcher(self.web3)
+        self.watcher = Watcher(self.web3, config.ETH_WS_URL, config.HEAD_POLL_MIN_INTERVAL, config.HEAD_POLL_MAX_INTERVAL,
+                               block_cache=block_cache, workers=config.SYNCER_WORKERS)
 
     def get_gas_price(self):
-        try:
-            resp = requests.get(config.ETH_GAS_URL, timeout=30)
-            if resp.status_code / 100 == 2:
-                rsp = json.loads(resp.content)
-                gas_price = self.web3.toWei(rsp.get(config.GAS_LEVEL) / 10, "gwei")
-                self.gas_price = gas_price
-                self.logger.info(f"new gas price: {self.gas_price}")
-        except Exception as e:
-            self.logger.fatal(f"get gas price error {e}")
+        gas_price = self.gas_oracle.price()
+        if gas_price is not None:
+            self.gas_price = gas_price
+        self.logger.debug(f"gas price: {self.gas_price} source:{self.gas_oracle.source} age:{self.gas_oracle.age()}")
 
 
     def _check_account_balance(self):
         self.get_gas_price()
-        if self.token.address != Address('0x0000000000000000000000000000000000000000'):
-            allowance = self.token.allowance(self.keeper_account, self.perp.address)
-            self.logger.info(f"address:{self.keeper_account} allowance:{allowance}")
-
-            if allowance.value == 0:
-                self.token.approve(self.perp.address, self.keeper_account)
-            margin_account = self.perp.getMarginAccount(self.keeper_account)
-            self.logger.info(f"address:{self.keeper_account} cash_balance:{margin_account.cash_balance}")
-            if margin_account.cash_balance.value == 0:
-                self.logger.error(f"your cash balance is {margin_account.cash_balance}, please deposit enough balance in perpetual contract {self.perp.address}")
-                return False
-        else:
-            eth_balance = self.web3.eth.getBalance(self.keeper_account.address)
-            self.logger.info(f"address:{self.keeper_account} eth_balance:{eth_balance}")
-            margin_account = self.perp.getMarginAccount(self.keeper_account)
-            self.logger.info(f"address:{self.keeper_account} cash_balance:{margin_account.cash_balance}")
-            if margin_account.cash_balance.value == 0:
-                #self.perp.depositEther(100, address, self.gas_price)
-                self.logger.error(f"your cash balance is {margin_account.cash_balance}, please deposit enough balance in perpetual contract {self.perp.address}")
-                return False
+        # the startup reads are independent, run them concurrently instead of one round trip after another
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            margin_account = executor.submit(self.perp.getMarginAccount, self.keeper_account)
+            if self.token.address != self.ZERO_ADDRESS:
+                allowance = executor.submit(self.token.allowance, self.keeper_account, self.perp.address)
+                eth_balance = None
+            else:
+                allowance = None
+                eth_balance = executor.submit(self.web3.eth.getBalance, self.keeper_account.address)
+            margin_account = margin_account.result()
+
+            if allowance is not None:
+                allowance = allowance.result()
+                self.logger.info(f"address:{self.keeper_account} allowance:{allowance}")
+                if allowance.value == 0:
+                    self.token.approve(self.perp.address, self.keeper_account)
+            else:
+                self.logger.info(f"address:{self.keeper_account} eth_balance:{eth_balance.result()}")
+
+        self.logger.info(f"address:{self.keeper_account} cash_balance:{margin_account.cash_balance}")
+        if margin_account.cash_balance.value == 0:
+            #self.perp.depositEther(100, address, self.gas_price)
+            self.logger.error(f"your cash balance is {margin_account.cash_balance}, please deposit enough balance in perpetual contract {self.perp.address}")
+            return False
 
         return True
 
@@ -94,6 +143,15 @@ class Keeper:
             self.web3.middleware_onion.add(construct_sign_and_send_raw_middleware(acct))
             self.keeper_account = Address(acct.address)
             self.keeper_account_key = read_key
+            schedule = GasSchedule(config.GAS_BUMP_BLOCKS, config.GAS_BUMP_SECONDS, config.GAS_BUMP_RATE,
+                                   self.web3.toWei(config.GAS_PRICE_MAX, "gwei"))
+            self.pipeline = TransactionPipeline(self.web3, acct, config.TX_TIMEOUT, config.TX_MAX_PENDING, schedule,
+                                                config.GAS_BUMP_MAX_TIMES, gas_price=self.gas_oracle.price, receipts=self.receipts,
+                                                builder=TransactionBuilder(self.web3, config.GAS_LIMIT_MARGIN, config.GAS_LIMIT_WINDOW,
+                                                                           config.TX_PREFLIGHT),
+                                                journal=self.store.namespace('transactions') if self.store else None)
+            self.fund.transactor = self.pipeline
+            self.AMM.transactor = self.pipeline
         except Exception as e:
             self.logger.warning(f"check private key error: {e}")
             return False
@@ -113,9 +171,14 @@ class Keeper:
         if size < config.POSITION_LIMIT:
             return
 
-        # skip if active orders exist
+        # skip if active orders exist, read from the local order view while it is fresh
         try:
-            active_orders = self.mcdex.get_active_orders()
+            age = self.market_data.age()
+            if age is not None and age <= 4 * config.MCDEX_SNAPSHOT_INTERVAL:
+                active_orders = self.market_data.active_orders()
+            else:
+                self.logger.warning(f"mcdex market data is stale. age:{age}")
+                active_orders = self.mcdex.get_active_orders()
             if len(active_orders) > 0:
                 self.logger.info(f"active orders exist. address:{self.keeper_account.address}")
                 return
@@ -128,12 +191,30 @@ class Keeper:
             side = "sell" if margin_account.side == PositionSide.SHORT else "buy"
 
         try:
-            self.mcdex.place_order(str(size), "market", "0", side, 300, str(config.LEVERAGE))
+            orders = self.order_executor.execute(size, side, "market", "0")
+            failed = [order for order in orders if order.state == OrderState.FAILED]
+            if len(failed) > 0:
+                self.logger.fatal(f"close position in mcdex failed. address:{self.keeper_account.address} failed:{len(failed)}/{len(orders)} error:{failed[0].error}")
         except Exception as e:
             self.logger.fatal(f"close position in mcdex failed. address:{self.keeper_account.address} error:{e}")
         return
 
+    def _prefetch_block_views(self):
+        # one round trip for the views both syncers read on every block, later calls hit the block cache
+        try:
+            self.multicall.call([
+                self.fund.view('rebalanceTarget'),
+                self.fund.view('state'),
+                self.fund.view('description'),
+                self.fund.view('totalSupply'),
+                self.perp.view('markPrice'),
+                self.perp.view('getMarginAccount', self.fund.address.address),
+            ])
+        except Exception as e:
+            self.logger.warning(f"prefetch block views fail. error:{e}")
+
     def _check_balance(self):
+        self._prefetch_block_views()
         try:
             target = self.fund.rebalanceTarget()
             if target.needRebalance:
@@ -145,12 +226,8 @@ class Keeper:
                 price_limit = self.perp.markPrice()
                 self.get_gas_price()
                 side = 2 if target.side == PositionSide.LONG else 1
-                tx_hash = self.fund.rebalance(target.amount, price_limit, side, self.keeper_account, self.gas_price)
-                transaction_status = self._wait_transaction_receipt(tx_hash, 10)
-                if transaction_status:
-                    self.logger.info(f"rebalance success. amount:{target.amount}")
-                else:
-                    self.logger.info(f"rebalance fail. amount:{target.amount}")
+                self._send_transaction("rebalance", f"rebalance. amount:{target.amount}",
+                    lambda nonce: self.fund.rebalance(target.amount, price_limit, side, self.keeper_account, self.gas_price, nonce))
         except Exception as e:
                 self.logger.fatal(f"check rebalance fail. error:{e}")
 
@@ -166,57 +243,52 @@ class Keeper:
         return trade_price
 
     def _get_redeeming_accounts(self):
-        user_list = []
-        query = '''
-            {
-                userInFunds(where: {fund: "%s", redeemingShareAmount_gt: 0}) {
-                    redeemingShareAmount
-                    user{
-                        id
-                    }
-                }
-            }
-        ''' % (config.FUND_ADDRESS.lower())
-        res = requests.post(config.FUND_GRAPH_URL, json={'query': query}, timeout=10)
-        if res.status_code == 200:
-            user_in_funds = res.json()['data']['userInFunds']
-            for user_in_fund in user_in_funds:
-                user_list.append(Address(user_in_fund['user']['id']))
-        return user_list
+        # served from memory, the index refreshes from fund events or the subgraph on its own thread
+        age = self.redeeming_index.age()
+        if age is None or age > 4 * config.FUND_GRAPH_INTERVAL:
+            self.logger.warning(f"redeeming accounts are stale. age:{age} graph block:{self.redeeming_index.indexed_block}")
+        return self.redeeming_index.accounts()
 
     def _check_redeeming_accounts(self):
+        self._prefetch_block_views()
         fund_state = self.fund.state()
         if fund_state == State.Normal:
             try:
-                fundMarginAccount = self.perp.getMarginAccount(Address(config.FUND_ADDRESS))
+                fundMarginAccount = self.perp.getMarginAccount(self.fund.address)
                 redeeming_accounts = self._get_redeeming_accounts()
+                price_limit = self._get_redeem_trade_price(fundMarginAccount.side)
+                side = 2 if fundMarginAccount.side == PositionSide.LONG else 1
+                share_amounts = self.fund.redeemingBalances(redeeming_accounts, config.RPC_BATCH_SIZE, config.RPC_BATCH_CONCURRENCY, self.http)
+                # submit every bid back to back, receipts are logged as they arrive
                 for account in redeeming_accounts:
-                    price_limit = self._get_redeem_trade_price(fundMarginAccount.side)
-                    share_amount = self.fund.redeemingBalance(account)
+                    if self.watcher.is_stale():
+                        # a newer head arrived, its run re-reads and bids the rest at its prices
+                        self.logger.info("bidRedeemingShare paused, block superseded by a newer head")
+                        break
+                    share_amount = share_amounts[account]
                     if share_amount > Wad(0):
-                        side = 2 if fundMarginAccount.side == PositionSide.LONG else 1
-                        tx_hash = self.fund.bidRedeemingShare(account, share_amount, price_limit, side , self.keeper_account, self.gas_price)
-                        transaction_status = self._wait_transaction_receipt(tx_hash, 10)
-                        if transaction_status:
-                            self.logger.info(f"bidRedeemingShare success. amount:{share_amount}")
-                        else:
-                            self.logger.info(f"bidRedeemingShare fail. amount:{share_amount}")
+                        try:
+                            self._send_transaction(f"bidRedeemingShare:{account}", f"bidRedeemingShare. amount:{share_amount}",
+                                lambda nonce, account=account, share_amount=share_amount: self.fund.bidRedeemingShare(
+                                    account, share_amount, price_limit, side, self.keeper_account, self.gas_price, nonce))
+                        except PipelineFull as e:
+                            # the rest waits for the next head, priced at that block
+                            self.logger.info(f"bidRedeemingShare paused, pipeline full. error:{e}")
+                            break
+                        except Exception as e:
+                            self.logger.fatal(f"bidRedeemingShare submit fail. account:{account} error:{e}")
             except Exception as e:
                 self.logger.fatal(f"_check_redeeming_accounts bidRedeemingShare fail. error:{e}")
         elif fund_state == State.Emergency:
             try:
-                fundMarginAccount = self.perp.getMarginAccount(Address(config.FUND_ADDRESS))
+                fundMarginAccount = self.perp.getMarginAccount(self.fund.address)
                 # price_limit = self._get_redeem_trade_price(fundMarginAccount.side)
                 price_limit = self.perp.markPrice()
                 total_supply = self.fund.total_supply()
                 self.get_gas_price()
                 side = 2 if fundMarginAccount.side == PositionSide.LONG else 1
-                tx_hash = self.fund.bidSettledShare(total_supply, price_limit, side, self.keeper_account, self.gas_price)
-                transaction_status = self._wait_transaction_receipt(tx_hash, 10)
-                if transaction_status:
-                    self.logger.info(f"bidSettledShare success. amount:{total_supply}")
-                else:
-                    self.logger.info(f"bidSettledShare fail. amount:{total_supply}")
+                self._send_transaction("bidSettledShare", f"bidSettledShare. amount:{total_supply}",
+                    lambda nonce: self.fund.bidSettledShare(total_supply, price_limit, side, self.keeper_account, self.gas_price, nonce))
             except Exception as e:
                 self.logger.fatal(f"_check_redeeming_accounts emergency fail. error:{e}")
 
@@ -233,30 +305,40 @@ class Keeper:
         return trade_price
 
 
-    def _wait_transaction_receipt(self, tx_hash, times):
-        self.logger.info(f"tx_hash:{self.web3.toHex(tx_hash)}")
-        for i in range(times):
-            try:
-                tx_receipt = self.web3.eth.waitForTransactionReceipt(tx_hash, config.TX_TIMEOUT)
-                self.logger.info(tx_receipt)
-                status = tx_receipt['status']
-
-                if status == 0:
-                    # transaction failed
-                    return False
-                elif status == 1:
-                    # transaction success
-                    return True
-            except:
-                try:
-                    # transaction pending, set new gas price
-                    self.get_gas_price()
-                    tx_hash = self.web3.eth.modifyTransaction(tx_hash, gasPrice=self.gas_price)
-                    self.logger.info(f"new tx_hash:{self.web3.toHex(tx_hash)} retry times:{i+1}")
-                except Exception as e:
-                    self.logger.info(f"set new price err: {e}")
-                    time.sleep(5)
-                    continue
+    def _send_transaction(self, purpose: str, description: str, send, max_bumps: int = None) -> bool:
+        """Submits through the pipeline unless a transaction for `purpose` is still pending, the
+        outcome is logged once it is mined so the calling syncer never waits for the receipt"""
+        future = self._in_flight.get(purpose)
+        if future is not None and not future.done():
+            self.logger.info(f"{description} skipped, previous transaction still pending")
+            return False
+
+        future = self.pipeline.submit(send, max_bumps, purpose)
+        self._track_transaction(purpose, description, future)
+        return True
+
+    def _track_transaction(self, purpose: str, description: str, future):
+        self._in_flight[purpose] = future
+
+        def on_done(future):
+            if self._in_flight.get(purpose) is future:
+                del self._in_flight[purpose]
+            receipt = future.result()
+            if receipt is not None and receipt['status'] == 1:
+                self.logger.info(f"{description} success")
+            else:
+                self.logger.info(f"{description} fail")
+        future.add_done_callback(on_done)
+
+    def _restore_transactions(self):
+        # transactions sent before a restart keep blocking their purpose until they resolve
+        for tx in self.pipeline.restore():
+            if tx.purpose is not None:
+                self._track_transaction(tx.purpose, f"{tx.purpose} (restored nonce:{tx.nonce})", tx.future)
+
+    def _on_head(self, header):
+        if self.store is not None:
+            self.store.put('keeper', 'last_block', header.number)
 
     def _get_keeper_liquidate_amount(self, keeper_account):
         markPrice = self.perp.markPrice()
@@ -280,38 +362,76 @@ class Keeper:
             return
 
         deadline = int(time.time()) + config.DEADLINE
-        amm_available_margin = self.AMM.current_available_margin()
-        self.logger.info(f"amm_available_margin:{amm_available_margin}")
-        amm_position_size = self.AMM.position_size()
-        self.logger.info(f"amm_position_size:{amm_position_size}")
-
         trade_side = PositionSide.LONG if margin_account.side == PositionSide.SHORT else PositionSide.SHORT
+        # priced from the mirrored pool state while it is fresh, the views are only called as a fallback
+        amm_state = self.amm_mirror.state()
+        age = self.amm_mirror.age()
         try:
-            trade_price = compute_AMM_price(amm_available_margin, amm_position_size, trade_side, margin_account.size)
+            if amm_state is not None and age <= config.AMM_MIRROR_MAX_AGE:
+                self.logger.info(f"amm state:{amm_state}")
+                trade_price = compute_AMM_price_from_state(amm_state, trade_side, margin_account.size)
+            else:
+                self.logger.warning(f"amm mirror is stale. age:{age}")
+                amm_available_margin = self.AMM.current_available_margin()
+                self.logger.info(f"amm_available_margin:{amm_available_margin}")
+                amm_position_size = self.AMM.position_size()
+                self.logger.info(f"amm_position_size:{amm_position_size}")
+                trade_price = compute_AMM_price(amm_available_margin, amm_position_size, trade_side, margin_account.size)
             self.logger.info(f"compute_price:{trade_price}")
         except Exception as e:
             self.logger.fatal(f"compute amm price failed. error:{e}")
             return
         trade_price = trade_price*Wad.from_number(1 - config.PRICE_SLIPPAGE) if trade_side == PositionSide.SHORT else trade_price*Wad.from_number(1 + config.PRICE_SLIPPAGE)
 
-        tx_hash = None
         try:
-            if trade_side == PositionSide.LONG:
-               tx_hash = self.AMM.buy(margin_account.size, trade_price, deadline, self.keeper_account, self.gas_price)
-            else:
-               tx_hash = self.AMM.sell(margin_account.size, trade_price, deadline, self.keeper_account, self.gas_price)
-            self.logger.info(f"close in AMM success. price:{trade_price} size{margin_account.size}")
-            # wait transaction times is 1, cause amm transaction deadline is 120s, if wait timeout, transaction will fail, no need to add gas price
-            transaction_status = self._wait_transaction_receipt(tx_hash, 1)
-            if transaction_status:
-                self.logger.info(f"close position in AMM success. price:{trade_price} size:{margin_account.size}")
-            else:
-                self.logger.info(f"close position in AMM fail. price:{trade_price} amount:{margin_account.size}")
+            trade = self.AMM.buy if trade_side == PositionSide.LONG else self.AMM.sell
+            # no gas bumps, cause amm transaction deadline is 120s, if wait timeout, transaction will fail, no need to add gas price
+            self._send_transaction("closePositionInAMM", f"close position in AMM. price:{trade_price} size:{margin_account.size}",
+                lambda nonce: trade(margin_account.size, trade_price, deadline, self.keeper_account, self.gas_price, nonce),
+                max_bumps=0)
         except Exception as e:
                 self.logger.fatal(f"close position in AMM failed. price:{trade_price} size:{margin_account.size} error:{e}")
 
+    def _on_first_head(self, header):
+        if self._first_head_seen:
+            return
+        self._first_head_seen = True
+        elapsed = time.monotonic() - self.started_at
+        metrics.time_to_first_block.set(value=elapsed)
+        self.logger.info(f"time to first block: {elapsed:.3f}s block:{header.number}")
+
     def main(self):
+        if config.METRICS_PORT:
+            metrics.registry.serve(config.METRICS_HOST, config.METRICS_PORT)
+        self.gas_oracle.start()
         if self._check_keeper_account() and self._check_account_balance():
-            self.watcher.add_block_syncer(self._check_balance)
-            self.watcher.add_block_syncer(self._check_redeeming_accounts)
+            self.receipts.start()
+            # only the position close reads the order view or the mirror
+            if config.CLOSE_KEEPER_POSITION and not config.CLOSE_IN_AMM:
+                self.mcdex.set_wallet(self.keeper_account_key, self.keeper_account)
+                self.market_data.start()
+            elif config.CLOSE_KEEPER_POSITION:
+                self.amm_mirror.start()
+                self.watcher.add_head_callback(lambda header: self.amm_mirror.on_block(header.number))
+            self.redeeming_index.start()
+            if isinstance(self.redeeming_index, EventRedeemingIndex):
+                self.watcher.add_head_callback(lambda header: self.redeeming_index.on_block(header.number))
+                try:
+                    if config.REDEEMING_INDEX_VALIDATE_SAMPLE > 0:
+                        self.redeeming_index.validate(config.REDEEMING_INDEX_VALIDATE_SAMPLE)
+                except Exception as e:
+                    self.logger.warning(f"validate redeeming index fail. error:{e}")
+            self._restore_transactions()
+            self.pipeline.start()
+            self.watcher.add_head_callback(self._on_head)
+            self.watcher.add_head_callback(self._on_first_head)
+            self.watcher.add_head_callback(lambda header: self.receipts.on_block(header.number))
+            self.watcher.add_head_callback(lambda header: self.pipeline.on_block(header.number))
+            self.watcher.add_reorg_callback(lambda depth, header: self.receipts.on_reorg(depth, header.number))
+            self.watcher.add_block_syncer(self._check_balance, priority=0, deadline=config.SYNCER_DEADLINE)
+            self.watcher.add_block_syncer(self._check_redeeming_accounts, priority=1, deadline=config.SYNCER_DEADLINE)
+            if config.CLOSE_KEEPER_POSITION:
+                self.watcher.add_block_syncer(self._check_keeper_account_position, priority=2, deadline=config.SYNCER_DEADLINE)
             self.watcher.run()
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,177 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+_DELETED = object()
+_MISSING = object()
+
+
+class StateStore:
+    """Keeper state kept across restarts in one SQLite database in WAL mode.
+
+    Values are JSON documents under (namespace, key). Writes from the syncers only land in a
+    pending map, repeated writes of a key coalesce there, and a background thread commits the
+    map every `flush_interval` seconds in a single transaction, so a block costs no fsync of its
+    own. Reads see pending writes first. Time series such as the gas price history are appended
+    to their own table and trimmed to the newest `history_size` points per series."""
+    logger = logging.getLogger()
+
+    def __init__(self, path: str, flush_interval: float = 1.0, history_size: int = 10000):
+        assert(flush_interval > 0)
+
+        self.path = path
+        self.flush_interval = flush_interval
+        self.history_size = history_size
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (namespace TEXT, key TEXT, value TEXT, PRIMARY KEY (namespace, key))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS history (series TEXT, at REAL, value TEXT)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS history_series_at ON history (series, at)")
+        self._db_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        # (namespace, key) -> value or _DELETED, and (series, at, value) rows, not yet committed
+        self._pending = {}
+        self._pending_history = []
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="state-store", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def namespace(self, name: str) -> 'Namespace':
+        return Namespace(self, name)
+
+    def series(self, name: str) -> 'Series':
+        return Series(self, name)
+
+    def get(self, namespace: str, key: str, default=None):
+        with self._lock:
+            value = self._pending.get((namespace, key), _MISSING)
+        if value is _DELETED:
+            return default
+        if value is not _MISSING:
+            return value
+        with self._db_lock:
+            row = self._db.execute("SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def items(self, namespace: str) -> dict:
+        # both reads under the database lock, as in `flush`, so a commit cannot fall between them
+        with self._db_lock:
+            rows = self._db.execute("SELECT key, value FROM state WHERE namespace = ?", (namespace,)).fetchall()
+            with self._lock:
+                pending = [(key, value) for (pending_namespace, key), value in self._pending.items() if pending_namespace == namespace]
+        values = {key: json.loads(value) for key, value in rows}
+        for key, value in pending:
+            if value is _DELETED:
+                values.pop(key, None)
+            else:
+                values[key] = value
+        return values
+
+    def put(self, namespace: str, key: str, value):
+        with self._lock:
+            self._pending[(namespace, key)] = value
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._pending[(namespace, key)] = _DELETED
+
+    def append(self, series: str, value, at: float = None):
+        with self._lock:
+            self._pending_history.append((series, time.time() if at is None else at, value))
+
+    def history(self, series: str, limit: int = 1) -> list:
+        """Returns the newest `limit` (at, value) points of a series, newest first"""
+        with self._db_lock:
+            with self._lock:
+                pending = [(at, value) for name, at, value in self._pending_history if name == series]
+            rows = self._db.execute("SELECT at, value FROM history WHERE series = ? ORDER BY at DESC LIMIT ?",
+                                    (series, limit)).fetchall()
+        points = sorted(pending, key=lambda point: point[0], reverse=True) + [(at, json.loads(value)) for at, value in rows]
+        return points[:limit]
+
+    def flush(self):
+        # the database lock is taken before the pending writes are swapped out, a reader that misses
+        # them in the pending map waits for the commit instead of reading the old rows
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                history, self._pending_history = self._pending_history, []
+            if len(pending) == 0 and len(history) == 0:
+                return
+            try:
+                self._db.execute("BEGIN")
+                for (namespace, key), value in pending.items():
+                    if value is _DELETED:
+                        self._db.execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+                    else:
+                        self._db.execute("INSERT OR REPLACE INTO state (namespace, key, value) VALUES (?, ?, ?)",
+                                         (namespace, key, json.dumps(value)))
+                self._db.executemany("INSERT INTO history (series, at, value) VALUES (?, ?, ?)",
+                                     [(series, at, json.dumps(value)) for series, at, value in history])
+                for series in {series for series, _, _ in history}:
+                    self._db.execute("DELETE FROM history WHERE series = ? AND at < (SELECT at FROM history WHERE series = ? "
+                                     "ORDER BY at DESC LIMIT 1 OFFSET ?)", (series, series, self.history_size - 1))
+                self._db.execute("COMMIT")
+            except sqlite3.Error as e:
+                self.logger.warning(f"flush state store fail. error:{e}")
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+                # keep the writes for the next flush unless newer ones replaced them
+                with self._lock:
+                    self._pending = {**pending, **self._pending}
+                    self._pending_history = history + self._pending_history
+
+    def _run(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+
+class Namespace:
+    """get/put/delete view of one StateStore namespace, what the lib caches and indexes persist through"""
+
+    def __init__(self, store: StateStore, name: str):
+        self.store = store
+        self.name = name
+
+    def get(self, key: str, default=None):
+        return self.store.get(self.name, key, default)
+
+    def items(self) -> dict:
+        return self.store.items(self.name)
+
+    def put(self, key: str, value):
+        self.store.put(self.name, key, value)
+
+    def delete(self, key: str):
+        self.store.delete(self.name, key)
+
+
+class Series:
+    """append/latest view of one StateStore history series"""
+
+    def __init__(self, store: StateStore, name: str):
+        self.store = store
+        self.name = name
+
+    def append(self, value):
+        self.store.append(self.name, value)
+
+    def latest(self, limit: int = 1) -> list:
+        return self.store.history(self.name, limit)
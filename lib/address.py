@@ -1,18 +1,57 @@
+import threading
+from collections import OrderedDict
 from functools import total_ordering
 import eth_utils
 
 
+# number of distinct addresses kept interned, least recently used ones are evicted first
+ADDRESS_CACHE_SIZE = 65536
+
+
 @total_ordering
 class Address:
-    def __init__(self, address):
+    """A checksummed Ethereum address.
+
+    Instances are immutable and interned through a bounded cache keyed by the lowercased
+    hex form, so constructing the same address again skips the keccak of the checksum
+    and usually returns the same object. Addresses are hashable and can key dicts and sets."""
+    __slots__ = ('address', 'raw')
+
+    _cache = OrderedDict()
+    _lock = threading.Lock()
+
+    def __new__(cls, address):
         if isinstance(address, Address):
-            self.address = address.address
-        else:
-            self.address = eth_utils.to_checksum_address(address)
+            return address
+
+        key = address.lower() if isinstance(address, str) else address
+        with cls._lock:
+            cached = cls._cache.get(key)
+            if cached is not None:
+                cls._cache.move_to_end(key)
+                return cached
+
+        checksum = eth_utils.to_checksum_address(address)
+        instance = object.__new__(cls)
+        object.__setattr__(instance, 'address', checksum)
+        object.__setattr__(instance, 'raw', bytes.fromhex(checksum[2:]))
+        with cls._lock:
+            # another thread may have interned it meanwhile, keep the first instance
+            instance = cls._cache.setdefault(key, instance)
+            cls._cache.move_to_end(key)
+            while len(cls._cache) > ADDRESS_CACHE_SIZE:
+                cls._cache.popitem(last=False)
+        return instance
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Address is immutable")
+
+    def __reduce__(self):
+        return (Address, (self.address,))
 
     def as_bytes(self) -> bytes:
         """Return the address as a 20-byte bytes array."""
-        return bytes.fromhex(self.address.replace('0x', ''))
+        return self.raw
 
     def __str__(self):
         return f"{self.address}"
@@ -22,8 +61,11 @@ class Address:
 
     def __eq__(self, other):
         assert(isinstance(other, Address))
-        return self.address == other.address
+        return self is other or self.raw == other.raw
 
     def __lt__(self, other):
         assert(isinstance(other, Address))
         return self.address < other.address
+
+    def __hash__(self):
+        return hash(self.raw)
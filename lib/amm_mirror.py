@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+
+from web3 import Web3
+
+from . import metrics
+from .address import Address
+from .contract import block_cache
+from .http_client import HttpClient, http_client
+from .multicall import Multicall
+from .rpc import batch_request
+from .wad import Wad
+
+
+_WAD = 10 ** 18
+_WORD = 32
+
+
+def _topic(signature: str) -> str:
+    return Web3.toHex(Web3.keccak(text=signature))
+
+
+def _words(data) -> list:
+    data = bytes.fromhex(data[2:]) if isinstance(data, str) else bytes(data)
+    return [int.from_bytes(data[i:i + _WORD], 'big', signed=True) for i in range(0, len(data), _WORD)]
+
+
+def _wmul(x: int, y: int) -> int:
+    # LibMathSigned.wmul, rounded half away from zero
+    z = x * y
+    return (abs(z) + _WAD // 2) // _WAD * (1 if z >= 0 else -1)
+
+
+def _wdiv(x: int, y: int) -> int:
+    # LibMathUnsigned.wdiv
+    return (x * _WAD + y // 2) // y
+
+
+class AMMState:
+    """The AMM pool as of `block_number`: the margin account of its perpetual proxy, the social
+    loss per contract of each side and the accumulated funding per contract of the last funding
+    update, with the available margin and fair price the AMM derives from them"""
+
+    def __init__(self, block_number: int, account: tuple, social_loss: dict, accumulated_funding: int):
+        self.block_number = block_number
+        self.account = account
+        self.social_loss = social_loss
+        self.accumulated_funding = accumulated_funding
+
+        side, size, entry_value, entry_social_loss, entry_funding_loss, cash_balance = account
+        available = cash_balance - entry_value
+        available -= _wmul(social_loss.get(side, 0), size) - entry_social_loss
+        available -= _wmul(accumulated_funding, size) - entry_funding_loss
+        self.available_margin = Wad(max(available, 0))
+        self.position_size = Wad(size)
+        self.fair_price = Wad(_wdiv(max(available, 0), size)) if size > 0 else None
+
+    def __repr__(self):
+        return f"AMMState(#{self.block_number} margin:{self.available_margin} size:{self.position_size})"
+
+
+class AMMMirror:
+    """Keeps the AMM pool state in memory so a trade can be priced without a call.
+
+    The proxy's margin account follows Perpetual UpdatePositionAccount, Deposit, Withdraw,
+    InternalUpdateBalance and Transfer logs, the social loss follows SocialLoss and the funding
+    follows AMM UpdateFundingRate, read with one batch of eth_getLogs per head, see `_get_logs`. As in
+    `lib.redeeming.EventRedeemingIndex` blocks deeper than `confirmations` are applied to a
+    confirmed state and the newer ones are re-read on top of a copy on every head. Every
+    `resync_blocks` the confirmed state is read from the chain again in one multicall, and any
+    difference from what the logs produced is logged as drift. With a `tolerance` the mirrored
+    state is then also checked against the AMM's own views, see `validate`.
+
+    The state carries the funding of the last funding update, the AMM's current* views also
+    accrue the funding since then, so `validate` reports a small drift that grows with time."""
+    logger = logging.getLogger()
+
+    UPDATE_POSITION_TOPIC = _topic('UpdatePositionAccount(address,(uint8,uint256,uint256,int256,int256,int256),uint256,uint256)')
+    BALANCE_TOPICS = (_topic('Deposit(address,int256,int256)'), _topic('Withdraw(address,int256,int256)'),
+                      _topic('InternalUpdateBalance(address,int256,int256)'))
+    TRANSFER_TOPIC = _topic('Transfer(address,address,int256,int256,int256)')
+    SOCIAL_LOSS_TOPIC = _topic('SocialLoss(uint8,int256)')
+    FUNDING_TOPIC = _topic('UpdateFundingRate((uint256,int256,int256,uint256,int256))')
+
+    def __init__(self, amm, perp, multicall: Multicall = None, confirmations: int = 12, resync_blocks: int = 100,
+                 tolerance: float = None, http: HttpClient = None):
+        assert(isinstance(amm.address, Address))
+        assert(isinstance(perp.address, Address))
+        assert(confirmations >= 0 and resync_blocks > confirmations)
+
+        self.amm = amm
+        self.perp = perp
+        self.web3 = amm.web3
+        self.multicall = multicall if multicall is not None else Multicall(amm.web3)
+        self.confirmations = confirmations
+        self.resync_blocks = resync_blocks
+        self.tolerance = tolerance
+        self.http = http if http is not None else http_client
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._head = None
+        self.proxy = None
+        # confirmed state as (account, social loss by side, accumulated funding), as of `_confirmed_block`
+        self._confirmed = None
+        self._confirmed_block = None
+        self._synced_block = None
+        self._state = None
+        self._updated_at = None
+
+    def start(self):
+        self.sync()
+        threading.Thread(target=self._run, name="amm-mirror", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def on_block(self, block_number: int):
+        self._head = block_number
+        self._wakeup.set()
+
+    def state(self) -> AMMState:
+        with self._lock:
+            return self._state
+
+    def age(self) -> float:
+        """Seconds since the mirror was last brought up to a head, None before that"""
+        with self._lock:
+            return None if self._updated_at is None else time.monotonic() - self._updated_at
+
+    def sync(self) -> bool:
+        try:
+            head = self._head if self._head is not None else self.web3.eth.blockNumber
+            confirmed_head = max(head - self.confirmations, 0)
+            resynced = self._confirmed is None or confirmed_head - self._synced_block >= self.resync_blocks
+            if resynced:
+                self.resync(confirmed_head)
+            elif confirmed_head > self._confirmed_block:
+                confirmed = self._copy(self._confirmed)
+                for log in self._get_logs(self._confirmed_block + 1, confirmed_head):
+                    self._apply(confirmed, log)
+                self._confirmed, self._confirmed_block = confirmed, confirmed_head
+
+            current = self._copy(self._confirmed)
+            if head > self._confirmed_block:
+                for log in self._get_logs(self._confirmed_block + 1, head):
+                    self._apply(current, log)
+            state = AMMState(head, tuple(current[0]), current[1], current[2])
+            with self._lock:
+                self._state = state
+                self._updated_at = time.monotonic()
+        except Exception as e:
+            self.logger.warning(f"sync amm mirror error {e}")
+            return False
+
+        if resynced and self.tolerance is not None:
+            try:
+                self.validate(self.tolerance)
+            except Exception as e:
+                self.logger.warning(f"validate amm mirror error {e}")
+        return True
+
+    def resync(self, block_number: int):
+        """Reads the pool state at `block_number` from the chain and makes it the confirmed state"""
+        if self.proxy is None:
+            self.proxy = Address(self.amm.view('perpetualProxy').call())
+        views = [
+            self.perp.view('getMarginAccount', self.proxy.address),
+            self.perp.view('socialLossPerContract', 1),
+            self.perp.view('socialLossPerContract', 2),
+            self.amm.view('lastFundingState'),
+        ]
+        account, short_social_loss, long_social_loss, funding_state = self._call(views, block_number)
+        fresh = [list(account), {1: short_social_loss, 2: long_social_loss}, funding_state[4]]
+
+        if self._confirmed is not None and self._confirmed_block == block_number and self._confirmed != fresh:
+            self.logger.warning(f"amm mirror drift at block {block_number}. mirrored:{self._confirmed} on chain:{fresh}")
+        elif self._confirmed is not None and self._confirmed_block < block_number:
+            # the gap is caught up from the logs first so the comparison is like for like
+            mirrored = self._copy(self._confirmed)
+            for log in self._get_logs(self._confirmed_block + 1, block_number):
+                self._apply(mirrored, log)
+            if mirrored != fresh:
+                self.logger.warning(f"amm mirror drift at block {block_number}. mirrored:{mirrored} on chain:{fresh}")
+        self._confirmed, self._confirmed_block, self._synced_block = fresh, block_number, block_number
+
+    def validate(self, tolerance: float = 0.001) -> dict:
+        """Compares the mirrored state with AMM.currentAvailableMargin, positionSize and
+        currentFairPrice at the same block, returns the relative drift of each and logs those
+        above `tolerance`"""
+        state = self.state()
+        views = [self.amm.view('currentAvailableMargin'), self.amm.view('positionSize'), self.amm.view('currentFairPrice')]
+        on_chain = self._call(views, state.block_number)
+        mirrored = (state.available_margin.value, state.position_size.value,
+                    state.fair_price.value if state.fair_price is not None else 0)
+        drifts = {}
+        for view, actual, value in zip(('available_margin', 'position_size', 'fair_price'), on_chain, mirrored):
+            drift = abs(value - actual) / actual if actual != 0 else float(value != 0)
+            drifts[view] = drift
+            metrics.amm_mirror_drift.set(view, value=drift)
+            if drift > tolerance:
+                self.logger.warning(f"amm mirror {view} drift {drift:.6f} at block {state.block_number}. mirrored:{value} on chain:{actual}")
+        return drifts
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._stopped.is_set():
+                self.sync()
+
+    def _call(self, views: list, block_number: int) -> list:
+        pinned = block_cache.pinned()
+        block_cache.pin(block_number)
+        try:
+            return self.multicall.call(views)
+        finally:
+            block_cache.pin(pinned)
+
+    def _get_logs(self, from_block: int, to_block: int) -> list:
+        """Reads the logs of the range in chain order. The account logs are filtered on the proxy
+        as trader, Transfer once as sender and once as receiver, and SocialLoss and
+        UpdateFundingRate have a filter each, all four sent in one JSON-RPC batch"""
+        proxy_topic = '0x' + '00' * 12 + self.proxy.address[2:].lower()
+        perp, amm = self.perp.address.address, self.amm.address.address
+        filters = [
+            {'address': perp, 'topics': [[self.UPDATE_POSITION_TOPIC, *self.BALANCE_TOPICS, self.TRANSFER_TOPIC], proxy_topic]},
+            {'address': perp, 'topics': [self.TRANSFER_TOPIC, None, proxy_topic]},
+            {'address': perp, 'topics': [self.SOCIAL_LOSS_TOPIC]},
+            {'address': amm, 'topics': [self.FUNDING_TOPIC]},
+        ]
+        block_range = {'fromBlock': hex(from_block), 'toBlock': hex(to_block)}
+        logs = {}
+        for chunk in batch_request(self.web3, [('eth_getLogs', [{**block_range, **filter_}]) for filter_ in filters], http=self.http):
+            for log in chunk:
+                # a transfer from the proxy to itself matches both transfer filters
+                logs[(int(log['blockNumber'], 16), int(log['logIndex'], 16))] = log
+        return [logs[key] for key in sorted(logs)]
+
+    @staticmethod
+    def _copy(state: list) -> list:
+        return [list(state[0]), dict(state[1]), state[2]]
+
+    def _apply(self, state: list, log):
+        # raw JSON-RPC logs, topics and data are hex strings
+        topic = log['topics'][0].lower()
+        emitter = Address(log['address'])
+        if emitter == self.amm.address:
+            if topic == self.FUNDING_TOPIC:
+                state[2] = _words(log['data'])[4]
+            return
+        if emitter != self.perp.address:
+            return
+
+        if topic == self.SOCIAL_LOSS_TOPIC:
+            side, value = _words(log['data'])
+            state[1][side] = value
+            return
+        traders = [Address('0x' + topic_[-40:]) for topic_ in log['topics'][1:]]
+        if topic == self.UPDATE_POSITION_TOPIC and traders[0] == self.proxy:
+            state[0] = _words(log['data'])[:6]
+        elif topic in self.BALANCE_TOPICS and traders[0] == self.proxy:
+            state[0][5] = _words(log['data'])[1]
+        elif topic == self.TRANSFER_TOPIC:
+            _, balance_from, balance_to = _words(log['data'])
+            if traders[0] == self.proxy:
+                state[0][5] = balance_from
+            if traders[1] == self.proxy:
+                state[0][5] = balance_to
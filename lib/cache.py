@@ -0,0 +1,28 @@
+import threading
+
+
+class MemoryCache:
+    """A get/put store kept in memory.
+
+    It is the default backing of the caches and indexes in lib, which persist across restarts
+    once the keeper hands them a namespace of its state store (`keeper.persistence`) instead."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self._values.get(key, default)
+
+    def items(self) -> dict:
+        with self._lock:
+            return dict(self._values)
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
@@ -0,0 +1,141 @@
+import eth_utils
+from eth_abi import encode_abi, decode_abi
+from web3._utils.abi import get_abi_input_types, get_abi_output_types
+
+from .address import Address
+
+
+_WORD = 32
+_MODULUS = 2 ** 256
+
+
+def _encode_address(value) -> bytes:
+    if isinstance(value, Address):
+        return bytes(12) + value.raw
+    return bytes(12) + bytes.fromhex(value[2:])
+
+
+def _encode_uint(value: int) -> bytes:
+    return value.to_bytes(_WORD, 'big')
+
+
+def _encode_int(value: int) -> bytes:
+    return (value % _MODULUS).to_bytes(_WORD, 'big')
+
+
+def _encode_bool(value: bool) -> bytes:
+    return _encode_uint(1 if value else 0)
+
+
+def _word_encoder(abi_type: str):
+    # arrays, fixed-size ones included, are not a single word
+    if '[' in abi_type:
+        return None
+    if abi_type == 'address':
+        return _encode_address
+    if abi_type == 'bool':
+        return _encode_bool
+    if abi_type.startswith('uint'):
+        return _encode_uint
+    if abi_type.startswith('int'):
+        return _encode_int
+    return None
+
+
+def _decode_uint(word: bytes) -> int:
+    return int.from_bytes(word, 'big')
+
+
+def _decode_int(word: bytes) -> int:
+    return int.from_bytes(word, 'big', signed=True)
+
+
+def _decode_bool(word: bytes) -> bool:
+    return word[_WORD - 1] != 0
+
+
+def _decode_address(word: bytes) -> str:
+    return eth_utils.to_checksum_address(word[12:])
+
+
+def _word_decoder(abi_type: str):
+    # arrays, fixed-size ones included, are not a single word
+    if '[' in abi_type:
+        return None
+    if abi_type == 'address':
+        return _decode_address
+    if abi_type == 'bool':
+        return _decode_bool
+    if abi_type.startswith('uint'):
+        return _decode_uint
+    if abi_type.startswith('int'):
+        return _decode_int
+    return None
+
+
+def _static_layout(outputs: list):
+    """Returns a list with a word decoder per static value, or a nested list per static tuple,
+    None when any output is dynamic or not a single 32-byte word"""
+    layout = []
+    for output in outputs:
+        if output['type'] == 'tuple':
+            components = _static_layout(output['components'])
+            if components is None:
+                return None
+            layout.append(components)
+        else:
+            decoder = _word_decoder(output['type'])
+            if decoder is None:
+                return None
+            layout.append(decoder)
+    return layout
+
+
+def _layout_words(layout: list) -> int:
+    return sum(_layout_words(item) if isinstance(item, list) else 1 for item in layout)
+
+
+class CallDescriptor:
+    """A view function compiled once from its ABI entry.
+
+    Holds the 4-byte selector, a word-by-word encoder when every argument is a static 32-byte
+    value and a fixed-layout decoder when every return value is, nested static tuples included.
+    Anything else falls back to eth-abi. Decoded values have the same shape as `ViewCall.decode`."""
+
+    def __init__(self, abi: dict, selector: str):
+        self.name = abi['name']
+        self.selector = bytes.fromhex(selector[2:])
+        self.input_types = get_abi_input_types(abi)
+        self.output_types = get_abi_output_types(abi)
+
+        encoders = [_word_encoder(abi_type) for abi_type in self.input_types]
+        self._encoders = None if None in encoders else encoders
+        self._layout = _static_layout(abi['outputs'])
+        self._size = _layout_words(self._layout) * _WORD if self._layout is not None else None
+
+    def encode(self, args: tuple) -> bytes:
+        """Returns the call data for `args`"""
+        if self._encoders is None:
+            return self.selector + encode_abi(self.input_types, list(args))
+        if len(args) != len(self._encoders):
+            raise TypeError(f"{self.name} takes {len(self._encoders)} arguments, {len(args)} given")
+        return self.selector + b''.join(encoder(arg) for encoder, arg in zip(self._encoders, args))
+
+    def decode(self, data: bytes):
+        # short data goes through eth-abi for its error
+        if self._layout is None or len(data) < self._size:
+            result = decode_abi(self.output_types, data)
+        else:
+            result, _ = self._decode_words(self._layout, data, 0)
+        return result[0] if len(result) == 1 else result
+
+    def _decode_words(self, layout: list, data: bytes, offset: int) -> tuple:
+        values = []
+        for item in layout:
+            if isinstance(item, list):
+                value, offset = self._decode_words(item, data, offset)
+            else:
+                value = item(data[offset:offset + _WORD])
+                offset += _WORD
+            values.append(value)
+        return tuple(values), offset
@@ -1,27 +1,268 @@
+import inspect
 import logging
 import json
-import pkg_resources
+import os
+import sys
+import threading
 
 import eth_utils
+from eth_abi import decode_abi
 from web3 import Web3
+from web3._utils.abi import abi_to_signature, get_abi_output_types
 from .address import Address
+from .cache import MemoryCache
+from .call_descriptor import CallDescriptor
+from .rpc import batch_request
+
+
+class BlockCache:
+    """Memoizes view call results for the block being processed.
+
+    Calls made from a thread pinned to a block are executed against that block and
+    cached per (contract, function, args, sender, block). Only the newest block's
+    generation is kept, calls pinned to an older block bypass the cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._block_number = None
+        self._values = {}
+        self.hits = 0
+        self.misses = 0
+
+    def new_block(self, block_number: int):
+        with self._lock:
+            self._block_number = block_number
+            self._values = {}
+
+    def pin(self, block_number: int):
+        self._local.block_number = block_number
+
+    def unpin(self):
+        self._local.block_number = None
+
+    def pinned(self):
+        return getattr(self._local, 'block_number', None)
+
+    def get(self, key: tuple, block_number: int):
+        """Returns (True, value) on a hit and (False, None) otherwise"""
+        with self._lock:
+            if block_number == self._block_number and key in self._values:
+                self.hits += 1
+                return True, self._values[key]
+            self.misses += 1
+            return False, None
+
+    def put(self, key: tuple, block_number: int, value):
+        with self._lock:
+            if block_number == self._block_number:
+                self._values[key] = value
+
+    def call(self, key: tuple, block_number: int, fetch):
+        hit, value = self.get(key, block_number)
+        if not hit:
+            value = fetch()
+            self.put(key, block_number, value)
+        return value
+
+
+block_cache = BlockCache()
+
+# parsed ABIs, selector tables and contract code checks, kept across restarts once `use_startup_cache` is given a store
+startup_cache = MemoryCache()
+
+
+def use_startup_cache(cache):
+    """Replaces the in-memory startup cache with a persistent get/put store"""
+    global startup_cache
+    startup_cache = cache
+
+
+def _has_code(code) -> bool:
+    return code not in ("0x", "0x0", b"", b"\x00", None)
+
+
+def verify_code(web3: Web3, addresses: list) -> dict:
+    """Returns address -> whether it holds contract code.
+
+    Addresses already verified against this node are answered from `startup_cache`, the others
+    are checked with one JSON-RPC batch of eth_getCode and remembered once found."""
+    assert(isinstance(web3, Web3))
+    assert(all(isinstance(address, Address) for address in addresses))
+
+    key = f"code:{web3.provider.endpoint_uri}"
+    verified = set(startup_cache.get(key, []))
+    result = {address: True for address in addresses if address.address in verified}
+    missing = [address for address in addresses if address not in result]
+    if len(missing) > 0:
+        codes = batch_request(web3, [('eth_getCode', [address.address, 'latest']) for address in missing])
+        for address, code in zip(missing, codes):
+            result[address] = _has_code(code)
+        found = [address.address for address in missing if result[address]]
+        if len(found) > 0:
+            startup_cache.put(key, sorted(verified.union(found)))
+    return result
+
+
+def load_abi(package: str, resource: str) -> tuple:
+    """Returns (abi, selectors) for an ABI file relative to `package`, `selectors` maps each
+    function signature to its 4-byte selector. Both are cached on disk until the file changes."""
+    path = os.path.normpath(os.path.join(os.path.dirname(sys.modules[package].__file__), resource))
+    stat = os.stat(path)
+    version = [stat.st_mtime_ns, stat.st_size]
+    key = f"abi:{path}"
+    cached = startup_cache.get(key)
+    if cached is not None and cached['version'] == version:
+        return cached['abi'], cached['selectors']
+
+    with open(path) as f:
+        abi = json.load(f)
+    selectors = {}
+    for item in abi:
+        if item.get('type') == 'function':
+            signature = abi_to_signature(item)
+            selectors[signature] = eth_utils.encode_hex(eth_utils.function_signature_to_4byte_selector(signature))
+    startup_cache.put(key, {'version': version, 'abi': abi, 'selectors': selectors})
+    return abi, selectors
+
+
+class LazyAbi:
+    """Contract class attribute that loads the ABI on first access instead of at import"""
+
+    def __init__(self, package: str, resource: str):
+        self.package = package
+        self.resource = resource
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._descriptors = {}
+
+    def load(self) -> tuple:
+        if self._loaded is None:
+            with self._lock:
+                if self._loaded is None:
+                    self._loaded = load_abi(self.package, self.resource)
+        return self._loaded
+
+    @property
+    def selectors(self) -> dict:
+        return self.load()[1]
+
+    def descriptor(self, function: str) -> CallDescriptor:
+        """Returns the cached CallDescriptor of a function that is not overloaded"""
+        descriptor = self._descriptors.get(function)
+        if descriptor is None:
+            abi, selectors = self.load()
+            items = [item for item in abi if item.get('type') == 'function' and item['name'] == function]
+            if len(items) != 1:
+                raise ValueError(f"expect one function named {function}, found {len(items)}")
+            descriptor = CallDescriptor(items[0], selectors[abi_to_signature(items[0])])
+            self._descriptors[function] = descriptor
+        return descriptor
+
+    def __get__(self, instance, owner) -> list:
+        return self.load()[0]
+
+
+class ViewCall:
+    """A view function call that can be run alone or batched with others"""
+
+    def __init__(self, contract, function: str, args: tuple, transaction: dict = None):
+        self.contract = contract
+        self.function = function
+        self.args = args
+        self.transaction = transaction
+        if function in contract.fast_views:
+            self.descriptor = contract.descriptor(function)
+            self.contract_function = None
+        else:
+            self.descriptor = None
+            self.contract_function = getattr(contract.contract.functions, function)(*args)
+        sender = transaction.get('from') if transaction else None
+        self.key = (contract.address.address, function, args, sender)
+
+    @property
+    def sender(self):
+        return self.key[3]
+
+    def call(self, block_identifier='latest'):
+        if self.descriptor is not None:
+            transaction = {**(self.transaction or {}), 'to': self.contract.address.address, 'data': self.encode()}
+            return self.decode(self.contract.web3.eth.call(transaction, block_identifier))
+        return self.contract_function.call(self.transaction, block_identifier=block_identifier)
+
+    def encode(self) -> str:
+        if self.descriptor is not None:
+            return eth_utils.encode_hex(self.descriptor.encode(self.args))
+        return self.contract.contract.encodeABI(fn_name=self.function, args=list(self.args))
+
+    def decode(self, data: bytes):
+        """Decodes raw return data the same way ContractFunction.call does"""
+        if self.descriptor is not None:
+            return self.descriptor.decode(data)
+        result = decode_abi(get_abi_output_types(self.contract_function.abi), data)
+        return result[0] if len(result) == 1 else result
 
 
 class Contract:
     logger = logging.getLogger()
 
+    # lib.transaction.TransactionPipeline that signs and sends writes, None to use web3's `transact`
+    transactor = None
+    # lib.receipt.ReceiptTracker used to wait for receipts, None to poll each transaction
+    receipts = None
+    # hot view functions called through precompiled CallDescriptors instead of web3's ContractFunction
+    fast_views = ()
+
+    @classmethod
+    def descriptor(cls, function: str) -> CallDescriptor:
+        return inspect.getattr_static(cls, 'abi').descriptor(function)
+
     @staticmethod
     def _get_contract(web3: Web3, abi: list, address: Address):
+        """Binds the ABI to the address, the code at the address is checked by `Contract.verify`"""
         assert(isinstance(web3, Web3))
         assert(isinstance(abi, list))
         assert(isinstance(address, Address))
 
-        code = web3.eth.getCode(address.address)
-        if (code == "0x") or (code == "0x0") or (code == b"\x00") or (code is None):
-            raise Exception(f"No contract found at {address}")
-
         return web3.eth.contract(address=address.address, abi=abi)
 
     @staticmethod
-    def _load_abi(package, resource) -> list:
-        return json.loads(pkg_resources.resource_string(package, resource))
+    def _load_abi(package, resource) -> LazyAbi:
+        return LazyAbi(package, resource)
+
+    @staticmethod
+    def verify(web3: Web3, contracts: list):
+        """Checks in one round trip that every contract has code, raises for the first one without"""
+        has_code = verify_code(web3, [contract.address for contract in contracts])
+        for contract in contracts:
+            if not has_code[contract.address]:
+                raise Exception(f"No contract found at {contract.address}")
+
+    @staticmethod
+    def _tx_params(user: Address, gasPrice: int, nonce: int = None, **kwargs) -> dict:
+        params = {'from': user.address, 'gasPrice': gasPrice, **kwargs}
+        if nonce is not None:
+            params['nonce'] = nonce
+        return params
+
+    def _transact(self, contract_function, params: dict):
+        if self.transactor is not None:
+            return self.transactor.send(contract_function, params)
+        return contract_function.transact(params)
+
+    def _wait_receipt(self, tx_hash, timeout: float = 120):
+        if self.receipts is not None:
+            return self.receipts.wait(tx_hash, timeout)
+        return self.web3.eth.waitForTransactionReceipt(tx_hash, timeout)
+
+    def view(self, function: str, *args, transaction: dict = None) -> ViewCall:
+        """Declares a view call for batching, see `lib.multicall.Multicall`"""
+        return ViewCall(self, function, args, transaction)
+
+    def _call(self, function: str, *args, transaction: dict = None):
+        """Calls a view function, against the block pinned to the current thread if any"""
+        view = self.view(function, *args, transaction=transaction)
+        block_number = block_cache.pinned()
+        if block_number is None:
+            return view.call()
+        return block_cache.call(view.key, block_number, lambda: view.call(block_number))
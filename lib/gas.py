@@ -0,0 +1,119 @@
+import json
+import logging
+import threading
+import time
+
+from web3 import Web3
+
+from . import metrics
+from .http_client import HttpClient, http_client
+
+
+class GasPriceOracle:
+    """Serves the latest gas price from memory and refreshes it from a gas station API in the background.
+
+    When the API has not answered for `stale_after` seconds the price is taken from the node's
+    own estimate (eth_gasPrice, computed from recent blocks) instead. Every price is appended to
+    `history` (an append/latest series) when given. At startup a last entry younger than `ttl`
+    is served as is and the first fetch is left to the background thread."""
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, url: str, level: str, ttl: float = 15, stale_after: float = 60, timeout: float = 30,
+                 history=None, http: HttpClient = None):
+        assert(isinstance(web3, Web3))
+        assert(0 < ttl <= stale_after)
+
+        self.web3 = web3
+        self.url = url
+        self.level = level
+        self.ttl = ttl
+        self.stale_after = stale_after
+        self.timeout = timeout
+        self.history = history
+        self.http = http if http is not None else http_client
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._price = None
+        self._source = None
+        self._updated_at = None
+
+    def start(self):
+        if not self._restore():
+            self.refresh()
+        threading.Thread(target=self._run, name="gas-price", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def age(self) -> float:
+        """Seconds since the current price was fetched, None before the first fetch"""
+        with self._lock:
+            return None if self._updated_at is None else time.monotonic() - self._updated_at
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    def price(self) -> int:
+        age = self.age()
+        if age is None or age > self.stale_after:
+            self._refresh_from_node()
+        with self._lock:
+            return self._price
+
+    def refresh(self):
+        if not self._refresh_from_oracle():
+            self._refresh_from_node()
+
+    def _run(self):
+        while not self._stopped.wait(self.ttl):
+            self.refresh()
+
+    def _refresh_from_oracle(self) -> bool:
+        try:
+            started_at = time.monotonic()
+            resp = self.http.get(self.url, timeout=self.timeout)
+            metrics.gas_price_fetch_latency.observe(time.monotonic() - started_at)
+            if resp.status_code // 100 != 2:
+                self.logger.warning(f"get gas price error status:{resp.status_code}")
+                return False
+            rsp = json.loads(resp.content)
+            self._update(self.web3.toWei(rsp.get(self.level) / 10, "gwei"), "oracle")
+            return True
+        except Exception as e:
+            self.logger.warning(f"get gas price error {e}")
+            return False
+
+    def _refresh_from_node(self):
+        try:
+            self._update(self.web3.eth.gasPrice, "node")
+        except Exception as e:
+            self.logger.fatal(f"get node gas price error {e}")
+
+    def _restore(self) -> bool:
+        if self.history is None:
+            return False
+        latest = self.history.latest(1)
+        if len(latest) == 0:
+            return False
+        at, point = latest[0]
+        age = time.time() - at
+        if not 0 <= age <= self.ttl:
+            return False
+        with self._lock:
+            self._price = point['price']
+            self._source = point['source']
+            self._updated_at = time.monotonic() - age
+        self.logger.info(f"gas price {point['price']} from {point['source']} restored, {age:.0f}s old")
+        return True
+
+    def _update(self, price: int, source: str):
+        with self._lock:
+            if price != self._price:
+                self.logger.info(f"new gas price: {price} from {source}")
+            self._price = price
+            self._source = source
+            self._updated_at = time.monotonic()
+        if self.history is not None:
+            self.history.append({'price': price, 'source': source})
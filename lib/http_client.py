@@ -0,0 +1,100 @@
+import json
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+
+# compact separators, one encoder shared by every request body
+_json_encoder = json.JSONEncoder(separators=(',', ':'))
+
+_IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+_RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class HttpClient:
+    """Shared HTTP client for the order book, the subgraph, the gas station and the node.
+
+    Every host gets its own requests.Session, so connections are kept alive and reused from a
+    pool of `pool_size`, and a semaphore bounding it to `max_concurrency` requests in flight.
+    Connection errors, timeouts and 429/5xx gateway statuses are retried up to `retries` times
+    with full-jitter exponential backoff, for idempotent methods or when `idempotent=True`."""
+    logger = logging.getLogger()
+
+    def __init__(self, pool_size: int = 10, max_concurrency: int = 10, retries: int = 2, backoff: float = 0.2,
+                 max_backoff: float = 2, timeout: float = 10):
+        assert(pool_size > 0 and max_concurrency > 0 and retries >= 0)
+
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # (scheme, host) -> (Session, BoundedSemaphore)
+        self._hosts = {}
+
+    def get(self, url: str, params=None, headers: dict = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, params=params, headers=headers, **kwargs)
+
+    def post(self, url: str, json=None, headers: dict = None, **kwargs) -> requests.Response:
+        return self.request('POST', url, json=json, headers=headers, **kwargs)
+
+    def delete(self, url: str, params=None, headers: dict = None, **kwargs) -> requests.Response:
+        return self.request('DELETE', url, params=params, headers=headers, **kwargs)
+
+    def request(self, method: str, url: str, params=None, json=None, headers: dict = None, timeout: float = None,
+                idempotent: bool = None) -> requests.Response:
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in _IDEMPOTENT_METHODS
+        data = None
+        if json is not None:
+            data = _json_encoder.encode(json).encode()
+            headers = {**(headers or {}), 'content-type': 'application/json'}
+        session, semaphore = self._host(url)
+        host = urlsplit(url).netloc
+
+        attempt = 0
+        while True:
+            started_at = time.monotonic()
+            try:
+                with semaphore:
+                    response = session.request(method, url, params=params, data=data, headers=headers,
+                                               timeout=timeout if timeout is not None else self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.http_requests.inc(host, 'error')
+                if not idempotent or attempt >= self.retries:
+                    raise
+                self.logger.debug(f"{method} {url} failed, retrying. error:{e}")
+            else:
+                metrics.http_requests.inc(host, str(response.status_code))
+                metrics.http_request_latency.observe(time.monotonic() - started_at, host)
+                if not idempotent or attempt >= self.retries or response.status_code not in _RETRY_STATUSES:
+                    return response
+                self.logger.debug(f"{method} {url} status:{response.status_code}, retrying")
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    def _host(self, url: str) -> tuple:
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        with self._lock:
+            host = self._hosts.get(key)
+            if host is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount(f"{parts.scheme}://", adapter)
+                host = self._hosts[key] = (session, threading.BoundedSemaphore(self.max_concurrency))
+            return host
+
+
+# used by the components that are not handed a client of their own
+http_client = HttpClient()
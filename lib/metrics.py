@@ -0,0 +1,163 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = None) -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value: float):
+        with self._lock:
+            self._values[label_values] = value
+
+    def expose(self) -> list:
+        lines = super().expose()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values = {}
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def expose(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, counts in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + ("+Inf",), counts[:-1]):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, label_values, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {counts[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class Registry:
+    logger = logging.getLogger()
+
+    def __init__(self):
+        self._metrics = []
+        self._server = None
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: tuple = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+    def serve(self, host: str, port: int):
+        """Serves the text exposition format on http://host:port/metrics from a daemon thread"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.expose().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+        self.logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+
+registry = Registry()
+
+syncer_duration = registry.histogram("keeper_syncer_duration_seconds", "Time spent in one block syncer run", ("syncer",))
+syncer_rpc_calls = registry.histogram("keeper_syncer_rpc_calls", "RPC requests issued by one block syncer run", ("syncer",),
+                                      buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+syncer_runs = registry.counter("keeper_syncer_runs_total", "Block syncer scheduling outcomes", ("result",))
+rpc_requests = registry.counter("keeper_rpc_requests_total", "JSON-RPC requests sent to the node", ("method",))
+head_dispatch_lag = registry.histogram("keeper_head_dispatch_lag_seconds", "Time from head arrival to syncer dispatch")
+tx_receipt_latency = registry.histogram("keeper_tx_receipt_latency_seconds", "Time from transaction submit to receipt", ("status",))
+http_requests = registry.counter("keeper_http_requests_total", "HTTP requests by host and status", ("host", "status"))
+http_request_latency = registry.histogram("keeper_http_request_seconds", "HTTP request latency by host", ("host",))
+gas_price_fetch_latency = registry.histogram("keeper_gas_price_fetch_seconds", "Gas price oracle request latency")
+time_to_first_block = registry.gauge("keeper_time_to_first_block_seconds", "Time from keeper start to the first head handled")
+amm_mirror_drift = registry.gauge("keeper_amm_mirror_drift_ratio", "Relative drift of the AMM mirror from the on-chain views", ("view",))
+
+_local = threading.local()
+
+
+def count_rpc(method: str):
+    rpc_requests.inc(method)
+    _local.rpc_calls = getattr(_local, 'rpc_calls', 0) + 1
+
+
+def thread_rpc_calls() -> int:
+    """RPC requests issued so far from the current thread"""
+    return getattr(_local, 'rpc_calls', 0)
+
+
+def rpc_counter_middleware(make_request, web3):
+    def middleware(method, params):
+        count_rpc(method)
+        return make_request(method, params)
+    return middleware
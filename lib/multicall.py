@@ -0,0 +1,93 @@
+import logging
+
+from eth_abi import encode_abi, decode_abi
+from eth_utils import function_signature_to_4byte_selector, to_hex
+from web3 import Web3
+
+from .address import Address
+from .contract import ViewCall, block_cache, verify_code
+from .http_client import HttpClient, http_client
+from .rpc import batch_request
+
+
+class Multicall:
+    """Runs a list of view calls in a single round trip.
+
+    Calls are aggregated through a deployed Multicall contract (`aggregate((address,bytes)[])`)
+    in one eth_call. Without an aggregator, or for calls that depend on `msg.sender`, the
+    eth_calls are sent as one JSON-RPC batch instead. When the current thread is pinned to a
+    block, results are read from and stored into the block cache."""
+    logger = logging.getLogger()
+
+    AGGREGATE_SELECTOR = function_signature_to_4byte_selector('aggregate((address,bytes)[])')
+
+    def __init__(self, web3: Web3, address: Address = None, chunk_size: int = 100, max_in_flight: int = 4,
+                 http: HttpClient = None):
+        assert(isinstance(web3, Web3))
+        assert(address is None or isinstance(address, Address))
+
+        self.web3 = web3
+        self.address = address
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+        self.http = http if http is not None else http_client
+        self._verified = None
+
+    def aggregator_available(self) -> bool:
+        if self.address is None:
+            return False
+        if self._verified is None:
+            self._verified = verify_code(self.web3, [self.address])[self.address]
+            if not self._verified:
+                self.logger.warning(f"no multicall contract found at {self.address}, using json-rpc batch")
+        return self._verified
+
+    def call(self, views: list) -> list:
+        assert(all(isinstance(view, ViewCall) for view in views))
+
+        block_number = block_cache.pinned()
+        results = [None] * len(views)
+        missing = []
+        for i, view in enumerate(views):
+            hit, value = block_cache.get(view.key, block_number) if block_number is not None else (False, None)
+            if hit:
+                results[i] = value
+            else:
+                missing.append(i)
+        if len(missing) == 0:
+            return results
+
+        aggregator_available = self.aggregator_available()
+        aggregated = [i for i in missing if aggregator_available and views[i].sender is None]
+        batched = [i for i in missing if not aggregator_available or views[i].sender is not None]
+
+        if len(aggregated) > 0:
+            values = self._aggregate([views[i] for i in aggregated], block_number if block_number is not None else 'latest')
+            for i, value in zip(aggregated, values):
+                results[i] = value
+        if len(batched) > 0:
+            values = self._batch([views[i] for i in batched], hex(block_number) if block_number is not None else 'latest')
+            for i, value in zip(batched, values):
+                results[i] = value
+
+        if block_number is not None:
+            for i in missing:
+                block_cache.put(views[i].key, block_number, results[i])
+        return results
+
+    def _aggregate(self, views: list, block_identifier) -> list:
+        calls = [(view.contract.address.address, Web3.toBytes(hexstr=view.encode())) for view in views]
+        data = self.AGGREGATE_SELECTOR + encode_abi(['(address,bytes)[]'], [calls])
+        raw = self.web3.eth.call({'to': self.address.address, 'data': to_hex(data)}, block_identifier)
+        _, return_data = decode_abi(['uint256', 'bytes[]'], raw)
+        return [view.decode(data) for view, data in zip(views, return_data)]
+
+    def _batch(self, views: list, block_identifier) -> list:
+        calls = []
+        for view in views:
+            transaction = {'to': view.contract.address.address, 'data': view.encode()}
+            if view.sender is not None:
+                transaction['from'] = view.sender
+            calls.append(('eth_call', [transaction, block_identifier]))
+        raw = batch_request(self.web3, calls, chunk_size=self.chunk_size, max_in_flight=self.max_in_flight, http=self.http)
+        return [view.decode(Web3.toBytes(hexstr=data)) for view, data in zip(views, raw)]
@@ -0,0 +1,123 @@
+import logging
+import threading
+from concurrent.futures import Future
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+
+class ReceiptTracker:
+    """Resolves transaction receipts from the head stream instead of polling each transaction.
+
+    Every new block's transaction hashes are fetched once and matched against the watched
+    hashes, receipts are only fetched for the matches. The cost per block is one getBlock
+    call however many transactions are pending, and nothing when none are."""
+    logger = logging.getLogger()
+
+    # blocks older than this are not scanned when heads were skipped
+    MAX_SCAN_BLOCKS = 64
+
+    def __init__(self, web3: Web3):
+        assert(isinstance(web3, Web3))
+
+        self.web3 = web3
+        self._lock = threading.Lock()
+        # hash -> Future, hashes not yet checked directly are kept in `_unchecked`
+        self._watched = {}
+        self._unchecked = set()
+        self._scanned = None
+        self._head = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self) -> bool:
+        """True once heads are flowing, before that waiters should poll"""
+        return self._thread is not None and self._head is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="receipts", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def watch(self, tx_hash) -> Future:
+        key = Web3.toHex(tx_hash)
+        with self._lock:
+            future = self._watched.get(key)
+            if future is None:
+                future = self._watched[key] = Future()
+                # it may already be in a block we scanned before it was watched
+                self._unchecked.add(key)
+        return future
+
+    def forget(self, tx_hash):
+        key = Web3.toHex(tx_hash)
+        with self._lock:
+            self._watched.pop(key, None)
+            self._unchecked.discard(key)
+
+    def wait(self, tx_hash, timeout: float):
+        """Blocks for the receipt, through the head stream once it is running and by polling before that"""
+        if not self.active:
+            return self.web3.eth.waitForTransactionReceipt(tx_hash, timeout)
+        try:
+            return self.watch(tx_hash).result(timeout)
+        finally:
+            self.forget(tx_hash)
+
+    def on_block(self, block_number: int):
+        self._head = block_number
+        self._wakeup.set()
+
+    def on_reorg(self, depth: int, block_number: int):
+        # rescan the new side of the fork, receipts already delivered are not revoked
+        with self._lock:
+            if self._scanned is not None:
+                self._scanned = min(self._scanned, block_number - 1)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self._scan()
+            except Exception as e:
+                self.logger.warning(f"scan receipts error: {e}")
+
+    def _scan(self):
+        head = self._head
+        with self._lock:
+            if len(self._watched) == 0:
+                self._scanned = head
+                return
+            unchecked, self._unchecked = self._unchecked, set()
+            start = head if self._scanned is None else max(self._scanned + 1, head - self.MAX_SCAN_BLOCKS + 1)
+
+        for key in unchecked:
+            self._check(key)
+
+        for block_number in range(start, head + 1):
+            block = self.web3.eth.getBlock(block_number)
+            hashes = {Web3.toHex(tx_hash) for tx_hash in block['transactions']}
+            with self._lock:
+                matches = [key for key in hashes if key in self._watched]
+            for key in matches:
+                self._check(key)
+            self._scanned = block_number
+
+    def _check(self, key: str):
+        try:
+            receipt = self.web3.eth.getTransactionReceipt(key)
+        except TransactionNotFound:
+            return
+        if receipt is None:
+            return
+        with self._lock:
+            future = self._watched.pop(key, None)
+            self._unchecked.discard(key)
+        if future is not None and not future.done():
+            future.set_result(receipt)
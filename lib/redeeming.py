@@ -0,0 +1,296 @@
+import logging
+import random
+import threading
+import time
+
+from web3 import Web3
+
+from .address import Address
+from .cache import MemoryCache
+from .http_client import HttpClient, http_client
+
+
+class GraphRedeemingIndex:
+    """Serves the fund accounts with a redeeming share amount from memory, refreshed from the
+    fund subgraph in the background.
+
+    Every `interval` seconds the subgraph's indexed block is read, and only when it has advanced
+    are all `userInFunds` rows paged through, ordered by id with an `id_gt` cursor and pinned to
+    that block so the pages form one snapshot. A failed refresh keeps the previous set."""
+    logger = logging.getLogger()
+
+    META_QUERY = '{ _meta { block { number } } }'
+    PAGE_QUERY = '''
+        {
+            userInFunds(block: {number: %d}, first: %d, orderBy: id, orderDirection: asc,
+                        where: {fund: "%s", redeemingShareAmount_gt: 0, id_gt: "%s"}) {
+                id
+                user {
+                    id
+                }
+            }
+        }
+    '''
+
+    def __init__(self, url: str, fund: Address, interval: float = 15, page_size: int = 1000, timeout: float = 10,
+                 http: HttpClient = None):
+        assert(isinstance(fund, Address))
+        assert(interval > 0 and 0 < page_size <= 1000)
+
+        self.url = url
+        self.fund = fund
+        self.interval = interval
+        self.page_size = page_size
+        self.timeout = timeout
+        self.http = http if http is not None else http_client
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._accounts = []
+        self._indexed_block = None
+        self._updated_at = None
+
+    def start(self):
+        self.refresh()
+        threading.Thread(target=self._run, name="redeeming-index", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def accounts(self) -> list:
+        with self._lock:
+            return self._accounts
+
+    @property
+    def indexed_block(self) -> int:
+        return self._indexed_block
+
+    def age(self) -> float:
+        """Seconds since the subgraph was last read successfully, None before that"""
+        with self._lock:
+            return None if self._updated_at is None else time.monotonic() - self._updated_at
+
+    def refresh(self) -> bool:
+        try:
+            block_number = self._query(self.META_QUERY)['_meta']['block']['number']
+            if block_number == self._indexed_block:
+                with self._lock:
+                    self._updated_at = time.monotonic()
+                return True
+
+            accounts = self._fetch_all(block_number)
+            with self._lock:
+                if len(accounts) != len(self._accounts):
+                    self.logger.info(f"redeeming accounts: {len(accounts)} at graph block {block_number}")
+                self._accounts = accounts
+                self._indexed_block = block_number
+                self._updated_at = time.monotonic()
+            return True
+        except Exception as e:
+            self.logger.warning(f"refresh redeeming accounts error {e}")
+            return False
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.refresh()
+
+    def _fetch_all(self, block_number: int) -> list:
+        # keyed on the address to drop duplicate rows while keeping the subgraph's order
+        accounts = {}
+        cursor = ""
+        while True:
+            rows = self._query(self.PAGE_QUERY % (block_number, self.page_size, self.fund.address.lower(), cursor))['userInFunds']
+            for row in rows:
+                accounts[Address(row['user']['id'])] = None
+            if len(rows) < self.page_size:
+                return list(accounts)
+            cursor = rows[-1]['id']
+
+    def _query(self, query: str) -> dict:
+        # queries only read, safe to retry
+        resp = self.http.post(self.url, json={'query': query}, timeout=self.timeout, idempotent=True)
+        if resp.status_code // 100 != 2:
+            raise Exception(f"graph status:{resp.status_code}")
+        body = resp.json()
+        if body.get('errors'):
+            raise Exception(f"graph errors:{body['errors']}")
+        return body['data']
+
+
+class EventRedeemingIndex:
+    """Keeps every account's redeeming share balance from the fund's own events, no subgraph needed.
+
+    IncreaseRedeemingShareBalance and DecreaseRedeemingShareBalance, emitted by requestToRedeem,
+    cancelRedeeming and bidRedeemingShare, are read with eth_getLogs in block ranges that halve
+    when the node rejects a range and double while it answers with few logs. Blocks deeper than
+    `confirmations` are applied to the confirmed balances, which are checkpointed with their last
+    block to `checkpoint` (any get/put store) so a restart only backfills the gap. The newer
+    blocks are re-read on every head on top of a copy, a reorg there never has to be undone."""
+    logger = logging.getLogger()
+
+    INCREASE_TOPIC = Web3.toHex(Web3.keccak(text='IncreaseRedeemingShareBalance(address,uint256)'))
+    DECREASE_TOPIC = Web3.toHex(Web3.keccak(text='DecreaseRedeemingShareBalance(address,uint256)'))
+
+    # persist the checkpoint at least every this many confirmed blocks even without new logs
+    CHECKPOINT_BLOCKS = 1000
+
+    def __init__(self, fund, start_block: int = 0, checkpoint=None, confirmations: int = 12,
+                 chunk_size: int = 5000, max_chunk_size: int = 100000, target_logs: int = 1000):
+        assert(isinstance(fund.address, Address))
+        assert(confirmations >= 0 and 0 < chunk_size <= max_chunk_size)
+
+        self.fund = fund
+        self.web3 = fund.web3
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.max_chunk_size = max_chunk_size
+        self.target_logs = target_logs
+        self._chunk_size = chunk_size
+        self._checkpoint = checkpoint if checkpoint is not None else MemoryCache()
+        self._checkpoint_key = f"redeeming:{fund.address.address}"
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._wakeup = threading.Event()
+        self._head = None
+        # confirmed state: balances as of block `_confirmed_block`
+        self._confirmed_block = start_block - 1
+        self._confirmed = {}
+        self._persisted_block = self._confirmed_block
+        # confirmed balances plus the unconfirmed blocks up to `_indexed_block`
+        self._balances = {}
+        self._indexed_block = None
+        self._updated_at = None
+        self._load_checkpoint()
+
+    def start(self):
+        self.sync()
+        threading.Thread(target=self._run, name="redeeming-index", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def on_block(self, block_number: int):
+        self._head = block_number
+        self._wakeup.set()
+
+    def accounts(self) -> list:
+        with self._lock:
+            return [address for address, balance in self._balances.items() if balance > 0]
+
+    def balance(self, address: Address) -> int:
+        with self._lock:
+            return self._balances.get(address, 0)
+
+    @property
+    def indexed_block(self) -> int:
+        return self._indexed_block
+
+    def age(self) -> float:
+        """Seconds since the index was last brought up to a head, None before that"""
+        with self._lock:
+            return None if self._updated_at is None else time.monotonic() - self._updated_at
+
+    def sync(self) -> bool:
+        try:
+            head = self._head if self._head is not None else self.web3.eth.blockNumber
+            confirmed_head = head - self.confirmations
+            if confirmed_head > self._confirmed_block:
+                backfill = confirmed_head - self._confirmed_block
+                logs = self._get_logs(self._confirmed_block + 1, confirmed_head)
+                for log in logs:
+                    self._apply(self._confirmed, log)
+                self._confirmed_block = confirmed_head
+                if backfill > 1:
+                    self.logger.info(f"redeeming index backfilled {backfill} blocks to {confirmed_head}")
+                if len(logs) > 0 or self._confirmed_block - self._persisted_block >= self.CHECKPOINT_BLOCKS:
+                    self._save_checkpoint()
+
+            balances = dict(self._confirmed)
+            if head > self._confirmed_block:
+                for log in self._get_logs(self._confirmed_block + 1, head):
+                    self._apply(balances, log)
+            with self._lock:
+                self._balances = balances
+                self._indexed_block = head
+                self._updated_at = time.monotonic()
+            return True
+        except Exception as e:
+            self.logger.warning(f"sync redeeming index error {e}")
+            return False
+
+    def validate(self, sample_size: int = 20) -> list:
+        """Compares a sample of indexed accounts with Fund.redeemingBalance, returns the mismatched
+        (address, indexed, on chain) and logs them. Balances that moved in the last blocks may differ."""
+        with self._lock:
+            addresses = list(self._balances)
+        sample = random.sample(addresses, min(sample_size, len(addresses)))
+        on_chain = self.fund.redeemingBalances(sample)
+        mismatches = [(address, self.balance(address), on_chain[address].value) for address in sample
+                      if self.balance(address) != on_chain[address].value]
+        for address, indexed, actual in mismatches:
+            self.logger.warning(f"redeeming index mismatch. account:{address} indexed:{indexed} on chain:{actual}")
+        self.logger.info(f"redeeming index validated {len(sample)} accounts, {len(mismatches)} mismatched")
+        return mismatches
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._stopped.is_set():
+                self.sync()
+
+    def _get_logs(self, from_block: int, to_block: int) -> list:
+        logs = []
+        start = from_block
+        while start <= to_block:
+            size = self._chunk_size
+            stop = min(to_block, start + size - 1)
+            try:
+                chunk = self.web3.eth.getLogs({
+                    'address': self.fund.address.address,
+                    'fromBlock': start,
+                    'toBlock': stop,
+                    'topics': [[self.INCREASE_TOPIC, self.DECREASE_TOPIC]],
+                })
+            except Exception as e:
+                if size == 1:
+                    raise
+                # too many results or too slow for the node, retry a smaller range
+                self._chunk_size = max(1, size // 2)
+                self.logger.debug(f"getLogs {start}-{stop} failed, range shrunk to {self._chunk_size}. error:{e}")
+                continue
+            logs.extend(chunk)
+            if len(chunk) < self.target_logs and stop - start + 1 == size:
+                self._chunk_size = min(self.max_chunk_size, size * 2)
+            start = stop + 1
+        return logs
+
+    def _apply(self, balances: dict, log):
+        account = Address(bytes(log['topics'][1][-20:]))
+        data = log['data']
+        amount = int(data, 16) if isinstance(data, str) else int.from_bytes(data, 'big')
+        if Web3.toHex(log['topics'][0]) == self.DECREASE_TOPIC:
+            amount = -amount
+        balance = balances.get(account, 0) + amount
+        if balance > 0:
+            balances[account] = balance
+        else:
+            balances.pop(account, None)
+
+    def _load_checkpoint(self):
+        checkpoint = self._checkpoint.get(self._checkpoint_key)
+        if checkpoint is None or checkpoint['block'] < self.start_block - 1:
+            return
+        self._confirmed_block = checkpoint['block']
+        self._confirmed = {Address(address): int(balance) for address, balance in checkpoint['balances'].items()}
+        self._persisted_block = self._confirmed_block
+        self.logger.info(f"redeeming index resumed from block {self._confirmed_block} with {len(self._confirmed)} accounts")
+
+    def _save_checkpoint(self):
+        self._checkpoint.put(self._checkpoint_key, {
+            'block': self._confirmed_block,
+            'balances': {address.address: str(balance) for address, balance in self._confirmed.items()},
+        })
+        self._persisted_block = self._confirmed_block
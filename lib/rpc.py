@@ -0,0 +1,50 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from web3 import Web3
+
+from .http_client import HttpClient, http_client
+from .metrics import count_rpc
+
+
+logger = logging.getLogger()
+
+
+def batch_request(web3: Web3, calls: list, timeout: int = 30, chunk_size: int = 100, max_in_flight: int = 4,
+                  http: HttpClient = None) -> list:
+    """Sends [(method, params), ...] as JSON-RPC batches of at most `chunk_size` calls with up to
+    `max_in_flight` batches outstanding through `http`, the shared client by default, results are
+    returned in call order"""
+    assert(isinstance(web3, Web3))
+    assert(chunk_size > 0 and max_in_flight > 0)
+    if len(calls) == 0:
+        return []
+
+    chunks = [calls[i:i + chunk_size] for i in range(0, len(calls), chunk_size)]
+    for _ in chunks:
+        count_rpc('batch')
+    if len(chunks) == 1:
+        return _post_batch(web3.provider.endpoint_uri, chunks[0], timeout, http)
+
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, len(chunks))) as executor:
+        chunk_results = executor.map(lambda chunk: _post_batch(web3.provider.endpoint_uri, chunk, timeout, http), chunks)
+        return [result for results in chunk_results for result in results]
+
+
+def _post_batch(endpoint_uri: str, calls: list, timeout: int, http: HttpClient = None) -> list:
+    http = http if http is not None else http_client
+    payload = [{"jsonrpc": "2.0", "id": i, "method": method, "params": params} for i, (method, params) in enumerate(calls)]
+    # batches here only read chain state, safe to retry
+    response = http.post(endpoint_uri, json=payload, timeout=timeout, idempotent=True)
+    response.raise_for_status()
+    responses = response.json()
+    if not isinstance(responses, list):
+        raise Exception(f"batch request rejected: {responses.get('error')}")
+
+    results = [None] * len(calls)
+    for item in responses:
+        if 'error' in item:
+            method = calls[item['id']][0]
+            raise Exception(f"{method} failed: {item['error']}")
+        results[item['id']] = item['result']
+    return results
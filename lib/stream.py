@@ -0,0 +1,92 @@
+import abc
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import websockets
+
+
+class FallbackStream(abc.ABC):
+    """Background thread fed by a websocket subscription when `ws_url` is set, and by polling
+    otherwise or while the socket is down.
+
+    A dropped socket, or one silent for `ws_timeout` seconds, falls back to polling for
+    `ws_retry_interval` seconds before it is opened again. Subclasses subscribe in `_subscribe`,
+    handle each decoded message in `_on_message` and poll once in `_poll_once`, which returns
+    the seconds to wait before the next poll."""
+    logger = logging.getLogger()
+
+    # thread name, and how the stream is called in logs
+    name = "stream"
+
+    def __init__(self, ws_url: str = None, ws_timeout: float = 60, ws_retry_interval: float = 30):
+        self.ws_url = ws_url
+        self.ws_timeout = ws_timeout
+        self.ws_retry_interval = ws_retry_interval
+
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self.ws_url:
+                try:
+                    asyncio.run(self._stream())
+                except Exception as e:
+                    self.logger.warning(f"{self.name} stream dropped: {e}, falling back to polling")
+                self._on_disconnect()
+                if self._stopped.is_set():
+                    break
+                self._poll(until=time.monotonic() + self.ws_retry_interval)
+            else:
+                self._poll(until=None)
+
+    async def _stream(self):
+        async with websockets.connect(self.ws_url, **self._connect_options()) as ws:
+            await self._subscribe(ws)
+
+            last_message = time.monotonic()
+            while not self._stopped.is_set():
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=1)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_message > self.ws_timeout:
+                        raise Exception(f"no message received for {self.ws_timeout} seconds")
+                    continue
+                last_message = time.monotonic()
+                self._on_message(json.loads(message))
+
+    def _poll(self, until: float = None):
+        while not self._stopped.is_set():
+            if until is not None and time.monotonic() >= until:
+                return
+            self._stopped.wait(self._poll_once())
+
+    def _connect_options(self) -> dict:
+        return {}
+
+    def _on_disconnect(self):
+        pass
+
+    @abc.abstractmethod
+    async def _subscribe(self, ws):
+        pass
+
+    @abc.abstractmethod
+    def _on_message(self, message: dict):
+        pass
+
+    @abc.abstractmethod
+    def _poll_once(self) -> float:
+        pass
@@ -0,0 +1,415 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import eth_utils
+from web3 import Web3
+from web3._utils.abi import abi_to_signature
+from web3.exceptions import TransactionNotFound
+
+from . import metrics
+from .address import Address
+from .call_descriptor import CallDescriptor
+from .receipt import ReceiptTracker
+
+
+class NonceManager:
+    """Hands out consecutive nonces for one account, read from the node only on first use and after errors"""
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, address: Address):
+        assert(isinstance(web3, Web3))
+        assert(isinstance(address, Address))
+
+        self.web3 = web3
+        self.address = address
+        self._lock = threading.Lock()
+        self._nonce = None
+
+    def reserve(self) -> int:
+        with self._lock:
+            if self._nonce is None:
+                self._nonce = self.web3.eth.getTransactionCount(self.address.address, 'pending')
+                self.logger.info(f"nonce for {self.address} synced to {self._nonce}")
+            nonce = self._nonce
+            self._nonce += 1
+            return nonce
+
+    def resync(self):
+        with self._lock:
+            self._nonce = None
+
+
+class TransactionBuilder:
+    """Builds contract transactions without the lookups web3's buildTransaction makes.
+
+    The chain id is read once. Gas limits come from a rolling window of the gas used by recent
+    successful transactions with the same function selector, times `margin`; eth_estimateGas is
+    only called for a selector with no history, or after one of its transactions ran out of gas.
+    eth_estimateGas also rejected calls that would revert, so with `preflight` a cached limit is
+    paired with one eth_call of the transaction, cheaper than an estimate, which raises instead of
+    letting a reverting rebalance or bid be mined and pay for its gas on every block."""
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, margin: float = 1.25, window: int = 20, preflight: bool = True):
+        assert(isinstance(web3, Web3))
+        assert(margin >= 1)
+
+        self.web3 = web3
+        self.margin = margin
+        self.window = window
+        self.preflight = preflight
+        self._chain_id = None
+        self._lock = threading.Lock()
+        # selector -> deque of gas used
+        self._gas_used = {}
+        # function signature -> CallDescriptor encoding its call data
+        self._descriptors = {}
+
+    @property
+    def chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = self.web3.eth.chainId
+        return self._chain_id
+
+    def build(self, contract_function, params: dict) -> dict:
+        assert('nonce' in params and 'gasPrice' in params)
+
+        transaction = {
+            'to': contract_function.address,
+            'data': self.encode(contract_function),
+            'value': params.get('value', 0),
+            'gasPrice': params['gasPrice'],
+            'nonce': params['nonce'],
+            'chainId': self.chain_id,
+        }
+        sender = params.get('from')
+        gas_limit = params['gas'] if 'gas' in params else self.cached_gas_limit(transaction['data'][:10])
+        if gas_limit is None:
+            # the estimate fails for a call that would revert, no preflight needed
+            gas_limit = self.estimate_gas_limit(transaction, sender)
+        elif self.preflight:
+            self.web3.eth.call({'from': sender, 'to': transaction['to'], 'data': transaction['data'],
+                                'value': transaction['value'], 'gas': gas_limit})
+        transaction['gas'] = gas_limit
+        return transaction
+
+    def encode(self, contract_function) -> str:
+        """Returns the call data of a bound ContractFunction, from its ABI entry and arguments"""
+        assert(not contract_function.kwargs)
+
+        signature = abi_to_signature(contract_function.abi)
+        descriptor = self._descriptors.get(signature)
+        if descriptor is None:
+            descriptor = CallDescriptor(contract_function.abi, eth_utils.encode_hex(eth_utils.function_signature_to_4byte_selector(signature)))
+            self._descriptors[signature] = descriptor
+        return eth_utils.encode_hex(descriptor.encode(contract_function.args))
+
+    def gas_limit(self, transaction: dict, sender: str) -> int:
+        gas_limit = self.cached_gas_limit(transaction['data'][:10])
+        return gas_limit if gas_limit is not None else self.estimate_gas_limit(transaction, sender)
+
+    def cached_gas_limit(self, selector: str) -> int:
+        with self._lock:
+            gas_used = self._gas_used.get(selector)
+            return int(max(gas_used) * self.margin) if gas_used else None
+
+    def estimate_gas_limit(self, transaction: dict, sender: str) -> int:
+        selector = transaction['data'][:10]
+        estimate = self.web3.eth.estimateGas({'from': sender, 'to': transaction['to'],
+                                              'data': transaction['data'], 'value': transaction['value']})
+        self.logger.info(f"estimated gas for selector {selector}: {estimate}")
+        self.record(selector, estimate)
+        return int(estimate * self.margin)
+
+    def record(self, selector: str, gas_used: int, gas_limit: int = None):
+        with self._lock:
+            if gas_limit is not None and gas_used >= gas_limit:
+                # ran out of gas, the history is too low for this call
+                self._gas_used.pop(selector, None)
+                return
+            self._gas_used.setdefault(selector, deque(maxlen=self.window)).append(gas_used)
+
+
+class GasSchedule:
+    """When and how far to raise the gas price of a pending transaction.
+
+    A replacement is sent every `every_blocks` blocks or `every_seconds` seconds (0 disables either),
+    each one paying `rate` times the previous price, never more than `max_price` wei."""
+
+    def __init__(self, every_blocks: int = 0, every_seconds: float = 60, rate: float = 1.125, max_price: int = None):
+        assert(every_blocks > 0 or every_seconds > 0)
+        # nodes reject replacements that pay less than 10% more
+        assert(rate >= 1.1)
+
+        self.every_blocks = every_blocks
+        self.every_seconds = every_seconds
+        self.rate = rate
+        self.max_price = max_price
+
+    def due(self, tx, block_number: int, now: float) -> bool:
+        if self.every_blocks and None not in (block_number, tx.block_number) and block_number - tx.block_number >= self.every_blocks:
+            return True
+        return bool(self.every_seconds) and now - tx.bumped_at >= self.every_seconds
+
+    def next_price(self, gas_price: int) -> int:
+        price = int(gas_price * self.rate)
+        return price if self.max_price is None else min(price, self.max_price)
+
+
+class InFlightTransaction:
+    def __init__(self, transaction: dict, tx_hash, block_number: int, max_bumps: int, purpose: str = None):
+        self.transaction = transaction
+        self.hashes = [tx_hash]
+        self.block_number = block_number
+        self.max_bumps = max_bumps
+        self.purpose = purpose
+        self.bumps = 0
+        self.submitted_at = time.monotonic()
+        self.bumped_at = self.submitted_at
+        # resolves to the receipt of whichever replacement is mined, None if it never is
+        self.future = Future()
+
+    @property
+    def nonce(self) -> int:
+        return self.transaction['nonce']
+
+    @property
+    def gas_price(self) -> int:
+        return self.transaction['gasPrice']
+
+    def to_record(self) -> dict:
+        return {
+            'transaction': self.transaction,
+            'hashes': [Web3.toHex(tx_hash) for tx_hash in self.hashes],
+            'max_bumps': self.max_bumps,
+            'bumps': self.bumps,
+            'purpose': self.purpose,
+        }
+
+    @classmethod
+    def from_record(cls, record: dict, block_number: int):
+        hashes = [Web3.toBytes(hexstr=tx_hash) for tx_hash in record['hashes']]
+        tx = cls(record['transaction'], hashes[0], block_number, record['max_bumps'], record['purpose'])
+        tx.hashes = hashes
+        tx.bumps = record['bumps']
+        return tx
+
+
+class PipelineFull(Exception):
+    """Raised by `TransactionPipeline.submit` while `max_pending` transactions are in flight"""
+
+
+class TransactionPipeline:
+    """Signs and submits keeper transactions locally and drives them to inclusion without blocking callers.
+
+    Contract wrappers with this pipeline as their `transactor` build their transactions here; each
+    one gets the next local nonce and a cached gas limit, is signed with the keeper key and broadcast
+    with a single eth_sendRawTransaction. `submit(send)` calls
+    `send(nonce)` and returns a future resolving to the transaction receipt. Pending transactions are
+    re-signed with a higher gas price on the `GasSchedule` from a background thread woken on every
+    new block (`on_block`). At most `max_pending` transactions are in flight, further submits raise
+    `PipelineFull` at once so the calling syncer never waits for a receipt.
+    With a `journal` (a get/put/delete/items store) every in-flight transaction is recorded there
+    and `restore` picks them up again after a restart."""
+    logger = logging.getLogger()
+
+    def __init__(self, web3: Web3, account, receipt_timeout: int = 300, max_pending: int = 16,
+                 schedule: GasSchedule = None, max_bumps: int = 10, poll_interval: float = 5, gas_price=None,
+                 receipts: ReceiptTracker = None, builder: TransactionBuilder = None, journal=None):
+        assert(isinstance(web3, Web3))
+        assert(max_pending > 0)
+
+        self.web3 = web3
+        self.account = account
+        self.address = Address(account.address)
+        self.max_pending = max_pending
+        self.receipt_timeout = receipt_timeout
+        self.schedule = schedule if schedule is not None else GasSchedule()
+        self.max_bumps = max_bumps
+        self.poll_interval = poll_interval
+        # optional callable returning the current market gas price, replacements pay at least that much
+        self.gas_price = gas_price
+        # receipts come from the tracker's block scan when given, otherwise each hash is polled
+        self.receipts = receipts
+        self.builder = builder if builder is not None else TransactionBuilder(web3)
+        self.nonce = NonceManager(web3, self.address)
+        self.journal = journal
+
+        self._submit_lock = threading.RLock()
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        # nonce -> InFlightTransaction
+        self._in_flight = {}
+        self._local = threading.local()
+        self._block_number = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="tx-pipeline", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def on_block(self, block_number: int):
+        self._block_number = block_number
+        self._wakeup.set()
+
+    def restore(self) -> list:
+        """Resumes tracking the transactions left in the journal by a previous run, returns them"""
+        if self.journal is None:
+            return []
+        restored = []
+        for key, record in self.journal.items().items():
+            tx = InFlightTransaction.from_record(record, self._block_number)
+            if tx.transaction['chainId'] != self.builder.chain_id:
+                self.journal.delete(key)
+                continue
+            with self._lock:
+                self._in_flight[tx.nonce] = tx
+            # restored transactions count against max_pending only while there is room
+            if self._pending.acquire(blocking=False):
+                tx.future.add_done_callback(lambda _: self._pending.release())
+            for tx_hash in tx.hashes:
+                self._watch(tx, tx_hash)
+            restored.append(tx)
+            self.logger.info(f"restored tx nonce:{tx.nonce} hashes:{len(tx.hashes)} purpose:{tx.purpose}")
+        return restored
+
+    def submit(self, send, max_bumps: int = None, purpose: str = None) -> Future:
+        assert(callable(send))
+
+        if not self._pending.acquire(blocking=False):
+            raise PipelineFull(f"{self.max_pending} transactions already pending")
+        self._local.sent = None
+        try:
+            # nonces must reach the node in order, so reserve and broadcast under one lock
+            with self._submit_lock:
+                send(self.nonce.reserve())
+        except Exception:
+            self.nonce.resync()
+            self._pending.release()
+            raise
+
+        tx = self._local.sent
+        if tx is None:
+            self._pending.release()
+            raise Exception("send did not go through the pipeline, set it as the contract transactor")
+        if max_bumps is not None:
+            tx.max_bumps = max_bumps
+        tx.purpose = purpose
+        self._record(tx)
+        tx.future.add_done_callback(lambda _: self._pending.release())
+        return tx.future
+
+    def send(self, contract_function, params: dict):
+        """Builds, signs and broadcasts a contract call, returns its hash"""
+        with self._submit_lock:
+            if params.get('nonce') is None:
+                params = dict(params, nonce=self.nonce.reserve())
+            transaction = self.builder.build(contract_function, params)
+            tx_hash = self._send_raw(transaction)
+
+        tx = InFlightTransaction(transaction, tx_hash, self._block_number, self.max_bumps)
+        with self._lock:
+            self._in_flight[tx.nonce] = tx
+        self._local.sent = tx
+        self._watch(tx, tx_hash)
+        self.logger.info(f"submitted tx_hash:{self.web3.toHex(tx_hash)} nonce:{tx.nonce} gas_price:{tx.gas_price}")
+        return tx_hash
+
+    def _send_raw(self, transaction: dict):
+        signed = self.account.sign_transaction(transaction)
+        return self.web3.eth.sendRawTransaction(signed.rawTransaction)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            with self._lock:
+                in_flight = list(self._in_flight.values())
+            for tx in in_flight:
+                try:
+                    self._check(tx)
+                except Exception as e:
+                    self.logger.warning(f"check tx nonce:{tx.nonce} error: {e}")
+
+    def _record(self, tx: InFlightTransaction):
+        if self.journal is not None:
+            self.journal.put(str(tx.nonce), tx.to_record())
+
+    def _watch(self, tx: InFlightTransaction, tx_hash):
+        if self.receipts is not None:
+            self.receipts.watch(tx_hash).add_done_callback(lambda future: self._resolve(tx, future.result()))
+
+    def _check(self, tx: InFlightTransaction):
+        receipt = self._find_receipt(tx) if self.receipts is None else None
+        now = time.monotonic()
+        if receipt is not None:
+            self._resolve(tx, receipt)
+        elif tx.bumps < tx.max_bumps and self.schedule.due(tx, self._block_number, now):
+            self._bump(tx, now)
+        elif tx.bumps >= tx.max_bumps and now - tx.bumped_at > self.receipt_timeout:
+            self.logger.warning(f"tx nonce:{tx.nonce} not mined after {tx.bumps} replacements, giving up")
+            self._resolve(tx, None)
+
+    def _find_receipt(self, tx: InFlightTransaction):
+        for tx_hash in tx.hashes:
+            try:
+                receipt = self.web3.eth.getTransactionReceipt(tx_hash)
+            except TransactionNotFound:
+                continue
+            if receipt is not None:
+                return receipt
+        return None
+
+    def _bump(self, tx: InFlightTransaction, now: float):
+        gas_price = self.schedule.next_price(tx.gas_price)
+        if self.gas_price is not None and self.gas_price() is not None:
+            gas_price = max(gas_price, self.schedule.next_price(self.gas_price()))
+        if gas_price < int(tx.gas_price * 1.1):
+            # capped, a replacement this cheap would be rejected
+            tx.max_bumps = tx.bumps
+            return
+        transaction = dict(tx.transaction, gasPrice=gas_price)
+        try:
+            tx_hash = self._send_raw(transaction)
+        except Exception as e:
+            # usually "nonce too low": one of the earlier versions was just mined
+            self.logger.info(f"replace tx nonce:{tx.nonce} error: {e}")
+            return
+        tx.transaction = transaction
+        tx.hashes.append(tx_hash)
+        tx.bumps += 1
+        tx.bumped_at = now
+        tx.block_number = self._block_number
+        self._record(tx)
+        self._watch(tx, tx_hash)
+        self.logger.info(f"new tx_hash:{self.web3.toHex(tx_hash)} gas_price:{gas_price} retry times:{tx.bumps}")
+
+    def _resolve(self, tx: InFlightTransaction, receipt):
+        with self._lock:
+            if self._in_flight.get(tx.nonce) is not tx:
+                return
+            del self._in_flight[tx.nonce]
+        if self.journal is not None:
+            self.journal.delete(str(tx.nonce))
+        if self.receipts is not None:
+            for tx_hash in tx.hashes:
+                self.receipts.forget(tx_hash)
+        if receipt is None or receipt['status'] != 1:
+            # a dropped or failed transaction may leave a nonce gap or a stale counter
+            self.nonce.resync()
+        # reverted receipts only count when they ran out of gas, which drops the selector's history
+        if receipt is not None and (receipt['status'] == 1 or receipt['gasUsed'] >= tx.transaction['gas']):
+            self.builder.record(tx.transaction['data'][:10], receipt['gasUsed'], tx.transaction['gas'])
+        if receipt is not None:
+            self.logger.info(receipt)
+            metrics.tx_receipt_latency.observe(time.monotonic() - tx.submitted_at, receipt['status'])
+        tx.future.set_result(receipt)
@@ -1,12 +1,43 @@
-from functools import total_ordering, reduce
-from decimal import *
+from functools import reduce
 
 
-_context = Context(prec=1000, rounding=ROUND_DOWN)
+_ONE = 10 ** 18
+
+
+def _div_down(numerator: int, denominator: int) -> int:
+    """Integer division rounding toward zero (Decimal ROUND_DOWN), unlike `//` which floors"""
+    quotient = abs(numerator) // abs(denominator)
+    return -quotient if (numerator < 0) != (denominator < 0) else quotient
+
+
+def _wad(value: int):
+    # skips the type checks of __init__ for values computed here
+    wad = object.__new__(Wad)
+    wad.value = value
+    return wad
+
+
+def _parse_number(number) -> int:
+    """Converts str(number) to an 18-decimal fixed-point int, truncating extra digits toward zero"""
+    text = str(number).strip().lower()
+    negative = text.startswith("-")
+    text = text.lstrip("+-")
+    exponent = 0
+    if "e" in text:
+        text, exp = text.split("e")
+        exponent = int(exp)
+    integral, _, fraction = text.partition(".")
+    digits = integral + fraction
+    if not digits.isdigit():
+        raise ArithmeticError(f"invalid number {number}")
+    exponent += 18 - len(fraction)
+    value = int(digits) * 10 ** exponent if exponent >= 0 else int(digits) // 10 ** -exponent
+    return -value if negative else value
 
 
-@total_ordering
 class Wad:
+    __slots__ = ('value',)
+
     def __init__(self, value):
         if isinstance(value, Wad):
             self.value = value.value
@@ -19,9 +50,9 @@ class Wad:
     @classmethod
     def from_number(cls, number):
         # assert(number >= 0)
-        pwr = Decimal(10) ** 18
-        dec = Decimal(str(number)) * pwr
-        return Wad(int(dec.quantize(1, context=_context)))
+        if isinstance(number, int):
+            return _wad(number * _ONE)
+        return _wad(_parse_number(number))
 
     def __repr__(self):
         return "Wad(" + str(self.value) + ")"
@@ -32,48 +63,93 @@ class Wad:
 
     def __add__(self, other):
         if isinstance(other, Wad):
-            return Wad(self.value + other.value)
+            return _wad(self.value + other.value)
+        elif isinstance(other, WadArray):
+            return NotImplemented
         else:
             raise ArithmeticError
 
     def __sub__(self, other):
         if isinstance(other, Wad):
-            return Wad(self.value - other.value)
+            return _wad(self.value - other.value)
+        elif isinstance(other, WadArray):
+            return NotImplemented
         else:
             raise ArithmeticError
 
     def __mul__(self, other):
         if isinstance(other, Wad):
-            result = Decimal(self.value) * Decimal(other.value) / (Decimal(10) ** Decimal(18))
-            return Wad(int(result.quantize(1, context=_context)))
+            return _wad(_div_down(self.value * other.value, _ONE))
         elif isinstance(other, int):
-            return Wad(int((Decimal(self.value) * Decimal(other)).quantize(1, context=_context)))
+            return _wad(self.value * other)
+        elif isinstance(other, WadArray):
+            return NotImplemented
         else:
             raise ArithmeticError
 
     def __truediv__(self, other):
         if isinstance(other, Wad):
-            return Wad(int((Decimal(self.value) * (Decimal(10) ** Decimal(18)) / Decimal(other.value)).quantize(1, context=_context)))
+            return _wad(_div_down(self.value * _ONE, other.value))
+        elif isinstance(other, WadArray):
+            return NotImplemented
         else:
             raise ArithmeticError
 
     def __abs__(self):
-        return Wad(abs(self.value))
+        return _wad(abs(self.value))
 
     def __eq__(self, other):
         if isinstance(other, Wad):
             return self.value == other.value
+        elif isinstance(other, WadArray):
+            return NotImplemented
+        else:
+            raise ArithmeticError
+
+    def __ne__(self, other):
+        if isinstance(other, Wad):
+            return self.value != other.value
+        elif isinstance(other, WadArray):
+            return NotImplemented
         else:
             raise ArithmeticError
 
     def __lt__(self, other):
         if isinstance(other, Wad):
             return self.value < other.value
+        elif isinstance(other, WadArray):
+            return NotImplemented
         else:
             raise ArithmeticError
 
+    def __le__(self, other):
+        if isinstance(other, Wad):
+            return self.value <= other.value
+        elif isinstance(other, WadArray):
+            return NotImplemented
+        else:
+            raise ArithmeticError
+
+    def __gt__(self, other):
+        if isinstance(other, Wad):
+            return self.value > other.value
+        elif isinstance(other, WadArray):
+            return NotImplemented
+        else:
+            raise ArithmeticError
+
+    def __ge__(self, other):
+        if isinstance(other, Wad):
+            return self.value >= other.value
+        elif isinstance(other, WadArray):
+            return NotImplemented
+        else:
+            raise ArithmeticError
+
+    __hash__ = None
+
     def __int__(self):
-        return int(self.value / 10**18)
+        return _div_down(self.value, _ONE)
 
     def __float__(self):
         return self.value / 10**18
@@ -87,3 +163,117 @@ class Wad:
     def max(*args):
         """Returns the higher of the Wad values"""
         return reduce(lambda x, y: x if x > y else y, args[1:], args[0])
+
+
+class WadArray:
+    """Many 18-decimal fixed-point values stored as plain ints, with elementwise Wad arithmetic.
+
+    Operands are another WadArray of the same length or a Wad applied to every element (and an int
+    for `*`). Rounding is the same as Wad: toward zero. Comparisons return masks (lists of bool)
+    usable with `where` and `select`."""
+    __slots__ = ('values',)
+
+    def __init__(self, values=()):
+        self.values = [Wad(value).value for value in values]
+
+    @classmethod
+    def _of(cls, values: list):
+        array = object.__new__(WadArray)
+        array.values = values
+        return array
+
+    @classmethod
+    def from_numbers(cls, numbers):
+        return cls._of([Wad.from_number(number).value for number in numbers])
+
+    def to_list(self) -> list:
+        return [_wad(value) for value in self.values]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return WadArray._of(self.values[index])
+        return _wad(self.values[index])
+
+    def __repr__(self):
+        return "WadArray([" + ", ".join(str(value) for value in self.values) + "])"
+
+    def _operand(self, other):
+        """Returns the other operand as a list of ints of the same length"""
+        if isinstance(other, WadArray):
+            if len(other.values) != len(self.values):
+                raise ArithmeticError(f"length mismatch {len(self.values)} != {len(other.values)}")
+            return other.values
+        elif isinstance(other, Wad):
+            return [other.value] * len(self.values)
+        else:
+            raise ArithmeticError
+
+    def __add__(self, other):
+        return WadArray._of([a + b for a, b in zip(self.values, self._operand(other))])
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return WadArray._of([a - b for a, b in zip(self.values, self._operand(other))])
+
+    def __rsub__(self, other):
+        return WadArray._of([b - a for a, b in zip(self.values, self._operand(other))])
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return WadArray._of([a * other for a in self.values])
+        return WadArray._of([_div_down(a * b, _ONE) for a, b in zip(self.values, self._operand(other))])
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        return WadArray._of([_div_down(a * _ONE, b) for a, b in zip(self.values, self._operand(other))])
+
+    def __rtruediv__(self, other):
+        return WadArray._of([_div_down(b * _ONE, a) for a, b in zip(self.values, self._operand(other))])
+
+    def __abs__(self):
+        return WadArray._of([abs(a) for a in self.values])
+
+    def __eq__(self, other):
+        return [a == b for a, b in zip(self.values, self._operand(other))]
+
+    def __ne__(self, other):
+        return [a != b for a, b in zip(self.values, self._operand(other))]
+
+    def __lt__(self, other):
+        return [a < b for a, b in zip(self.values, self._operand(other))]
+
+    def __le__(self, other):
+        return [a <= b for a, b in zip(self.values, self._operand(other))]
+
+    def __gt__(self, other):
+        return [a > b for a, b in zip(self.values, self._operand(other))]
+
+    def __ge__(self, other):
+        return [a >= b for a, b in zip(self.values, self._operand(other))]
+
+    __hash__ = None
+
+    def where(self, mask: list, other):
+        """Elements of self where mask is True, of `other` elsewhere"""
+        return WadArray._of([a if m else b for a, b, m in zip(self.values, self._operand(other), mask)])
+
+    def select(self, mask: list):
+        """Elements of self where mask is True"""
+        return WadArray._of([a for a, m in zip(self.values, mask) if m])
+
+    def min(self) -> Wad:
+        return _wad(min(self.values))
+
+    def max(self) -> Wad:
+        return _wad(max(self.values))
+
+    def sum(self) -> Wad:
+        return _wad(sum(self.values))
@@ -1 +1,3 @@
-from .mcdex import Mcdex
\ No newline at end of file
+from .mcdex import Mcdex
+from .market_data import MarketData
+from .execution import ChildOrder, OrderExecutor, OrderState
@@ -17,13 +17,17 @@ class EthPersonalSign(object):
     def __init__(self, private_key):
         private_key_bytes = decode_hex(private_key)
         self._raw_key = private_key_bytes
+        # parsed once, rebuilding it from the raw bytes costs about as much as a signature
+        self._private_key = coincurve.PrivateKey(private_key_bytes)
+
+    def signHashes(self, msg_hashes: list) -> list:
+        return [self.signHash(msg_hash_bytes) for msg_hash_bytes in msg_hashes]
 
     def signHash(self, msg_hash_bytes: bytes):
         if len(msg_hash_bytes) != 32:
             raise ValueError("The message hash must be exactly 32-bytes")
-        key = self._raw_key
 
-        signature_bytes = coincurve.PrivateKey(key).sign_recoverable(
+        signature_bytes = self._private_key.sign_recoverable(
             msg_hash_bytes,
             hasher=None,
         )
@@ -0,0 +1,165 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from enum import Enum
+
+from .market_data import MarketData
+from .mcdex import Mcdex
+
+
+class OrderState(Enum):
+     NEW = 0
+     BUILT = 1
+     OPEN = 2
+     FILLED = 3
+     CANCELED = 4
+     # left the book without the view telling filled from canceled
+     CLOSED = 5
+     FAILED = 6
+
+
+class ChildOrder():
+    def __init__(self, amount: int, side: str, order_type: str, price: str):
+        self.amount = amount
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.id = None
+        self.state = OrderState.NEW
+        # amount still on the book, as last reported by the market data
+        self.available = amount
+        self.error = None
+        self.placed_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in (OrderState.FILLED, OrderState.CANCELED, OrderState.CLOSED, OrderState.FAILED)
+
+    def __repr__(self):
+        return f"ChildOrder({self.side} {self.amount} {self.state.name} {self.id})"
+
+
+class OrderExecutor:
+    """Places a large close as child orders of at most `child_size`, in multiples of `lot_size`.
+
+    Each child goes through build, sign and submit on its own worker, up to `concurrency` of them
+    at once, so a close takes about as long as its slowest child rather than the sum of three
+    round trips per child. Children are tracked locally. Their state follows the market data view
+    once submitted, and open ones can be cancelled, or cancelled and re-placed, in one call."""
+    logger = logging.getLogger()
+
+    def __init__(self, mcdex: Mcdex, market_data: MarketData = None, lot_size: int = 1, child_size: int = None,
+                 concurrency: int = 8, expires: int = 300, leverage: str = "5"):
+        assert(isinstance(mcdex, Mcdex))
+        assert(lot_size > 0 and concurrency > 0)
+        assert(child_size is None or child_size >= lot_size)
+
+        self.mcdex = mcdex
+        self.market_data = market_data
+        self.lot_size = lot_size
+        self.child_size = child_size
+        self.expires = expires
+        self.leverage = leverage
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mcdex-orders")
+        self._lock = threading.Lock()
+        self._orders = []
+
+    def split(self, amount: int) -> list:
+        lots = amount // self.lot_size
+        if amount % self.lot_size != 0:
+            self.logger.debug(f"order amount {amount} rounded down to lot size {self.lot_size}")
+        child_lots = lots if self.child_size is None else self.child_size // self.lot_size
+        sizes = []
+        while lots > 0:
+            size = min(lots, child_lots)
+            sizes.append(size * self.lot_size)
+            lots -= size
+        return sizes
+
+    def execute(self, amount: int, side: str, order_type: str = "market", price: str = "0") -> list:
+        """Places `amount` as child orders and returns them once every child is open or failed"""
+        orders = [ChildOrder(size, side, order_type, price) for size in self.split(amount)]
+        # drops the finished children of earlier closes so the tracked list stays bounded
+        self.orders()
+        with self._lock:
+            self._orders.extend(orders)
+        wait([self._executor.submit(self._place, order) for order in orders])
+        failed = sum(1 for order in orders if order.state == OrderState.FAILED)
+        self.logger.info(f"placed {len(orders) - failed}/{len(orders)} child orders. side:{side} amount:{amount}")
+        return orders
+
+    def orders(self) -> list:
+        """Tracked child orders with their state refreshed, finished ones are dropped after this call"""
+        with self._lock:
+            orders = list(self._orders)
+        for order in orders:
+            self._refresh(order)
+        with self._lock:
+            self._orders = [order for order in self._orders if not order.done]
+        return orders
+
+    def active(self) -> list:
+        return [order for order in self.orders() if order.state == OrderState.OPEN]
+
+    def cancel(self, orders: list = None) -> list:
+        """Cancels `orders`, all open ones by default, concurrently and returns those cancelled"""
+        orders = self.active() if orders is None else orders
+        wait([self._executor.submit(self._cancel, order) for order in orders])
+        return [order for order in orders if order.state == OrderState.CANCELED]
+
+    def replace(self, order_type: str = "market", price: str = "0", orders: list = None) -> list:
+        """Cancels open orders and places what they had left on the book again at `price`"""
+        canceled = self.cancel(orders)
+        replaced = []
+        for side in {order.side for order in canceled}:
+            amount = sum(order.available for order in canceled if order.side == side)
+            replaced.extend(self.execute(amount, side, order_type, price))
+        return replaced
+
+    def _place(self, order: ChildOrder):
+        try:
+            unsigned_order = self.mcdex.build_unsigned_order(amount=str(order.amount), price=order.price, side=order.side,
+                                                             order_type=order.order_type, expires=self.expires,
+                                                             targetLeverage=self.leverage)
+            order.id = unsigned_order["id"]
+            order.state = OrderState.BUILT
+            self.mcdex.submit_order(order.id, self.mcdex.sign_orders([order.id])[0])
+            order.state = OrderState.OPEN
+            order.placed_at = time.monotonic()
+            if self.market_data is not None:
+                # counted as active until the stream or the next snapshot reports its real state
+                self.market_data.on_order({**unsigned_order, "status": "pending"})
+        except Exception as e:
+            order.state = OrderState.FAILED
+            order.error = e
+            self.logger.warning(f"place child order fail. {order} error:{e}")
+
+    def _cancel(self, order: ChildOrder):
+        try:
+            self.mcdex.cancel_order(order.id)
+            order.state = OrderState.CANCELED
+        except Exception as e:
+            self.logger.warning(f"cancel child order fail. {order} error:{e}")
+
+    def _refresh(self, order: ChildOrder):
+        if order.state != OrderState.OPEN:
+            return
+        if self.market_data is None:
+            # without a view an order is only known to be off the book once it has expired
+            if time.monotonic() - order.placed_at > self.expires:
+                order.state = OrderState.CLOSED
+            return
+        view = self.market_data.order(order.id)
+        if view is None:
+            order.state = OrderState.CLOSED
+            return
+        if view.get("availableAmount") is not None:
+            order.available = int(float(view["availableAmount"]))
+        status = view.get("status")
+        if status == "full_filled":
+            order.state = OrderState.FILLED
+        elif status == "canceled":
+            order.state = OrderState.CANCELED
+        elif status not in MarketData.ACTIVE_STATUSES:
+            order.state = OrderState.CLOSED
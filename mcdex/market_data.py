@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+
+from lib.stream import FallbackStream
+from .mcdex import Mcdex
+
+
+class MarketData(FallbackStream):
+    """Keeps the keeper's open orders and the market's last index price in memory.
+
+    With a `ws_url` the order book's socket pushes them: the keeper subscribes to its
+    `TraderAddress#<address>` channel for `orderChange` messages and to `Market#<market id>`
+    for the index price, authenticated with the Mai-Authentication header on the handshake.
+    Each (re)connect is followed by a REST snapshot of the pending orders and the market status.
+    Without a socket, or while it is down, the snapshot is re-read every `snapshot_interval`
+    seconds instead. An order changed by a delta after a snapshot was requested keeps its delta,
+    so a slow snapshot never rolls a newer state back."""
+    name = "mcdex-market-data"
+
+    ACTIVE_STATUSES = ('pending', 'partial_filled')
+
+    def __init__(self, mcdex: Mcdex, ws_url: str = None, snapshot_interval: float = 5, ws_timeout: float = 60,
+                 ws_retry_interval: float = 30):
+        assert(isinstance(mcdex, Mcdex))
+        assert(snapshot_interval > 0)
+        super().__init__(ws_url, ws_timeout, ws_retry_interval)
+
+        self.mcdex = mcdex
+        self.snapshot_interval = snapshot_interval
+
+        self._lock = threading.Lock()
+        # order id -> (order, monotonic time of the update it came from)
+        self._orders = {}
+        self._index_price = None
+        self._updated_at = None
+        self._streaming = False
+
+    def active_orders(self) -> list:
+        with self._lock:
+            return [order for order, _ in self._orders.values() if order.get('status') in self.ACTIVE_STATUSES]
+
+    def order(self, order_id: str) -> dict:
+        with self._lock:
+            entry = self._orders.get(order_id)
+            return None if entry is None else entry[0]
+
+    def index_price(self) -> str:
+        with self._lock:
+            return self._index_price
+
+    @property
+    def streaming(self) -> bool:
+        return self._streaming
+
+    def age(self) -> float:
+        """Seconds since the view was last confirmed by a snapshot or a message, None before that"""
+        with self._lock:
+            return None if self._updated_at is None else time.monotonic() - self._updated_at
+
+    def on_order(self, order: dict):
+        """Applies one order delta, from the socket or from an order the keeper just placed"""
+        with self._lock:
+            self._orders[order['id']] = (order, time.monotonic())
+            self._updated_at = time.monotonic()
+
+    def snapshot(self) -> bool:
+        requested_at = time.monotonic()
+        try:
+            orders = self.mcdex.get_active_orders()
+            index_price = self.mcdex.get_market_status()
+        except Exception as e:
+            self.logger.warning(f"mcdex snapshot error {e}")
+            return False
+
+        snapshot = {order['id']: order for order in orders}
+        with self._lock:
+            merged = {}
+            for order_id, (order, changed_at) in self._orders.items():
+                # newer than the snapshot: keep it even if the snapshot does not list it yet
+                if changed_at > requested_at:
+                    merged[order_id] = (order, changed_at)
+            for order_id, order in snapshot.items():
+                if order_id not in merged:
+                    merged[order_id] = (order, requested_at)
+            added = len(set(snapshot) - set(self._orders))
+            removed = len(set(self._orders) - set(merged))
+            self._orders = merged
+            self._index_price = index_price
+            self._updated_at = time.monotonic()
+        if added or removed:
+            self.logger.debug(f"mcdex snapshot: {len(snapshot)} active orders, {added} new, {removed} gone")
+        return True
+
+    def _connect_options(self) -> dict:
+        return {'extra_headers': self.mcdex.generate_auth_headers()}
+
+    async def _subscribe(self, ws):
+        await ws.send(json.dumps({"type": "subscribe", "channels": [
+            f"Market#{self.mcdex.market_id}", f"TraderAddress#{self.mcdex.wallet.address}"]}))
+        # deltas received from here on are newer than the snapshot
+        self.snapshot()
+        self._streaming = True
+        self.logger.info(f"Subscribed to mcdex market {self.mcdex.market_id} on {self.ws_url}")
+
+    def _on_message(self, message: dict):
+        kind = message.get('type')
+        if kind == 'orderChange':
+            self.on_order(message['order'])
+        elif kind in ('marketStatus', 'indexPriceChange'):
+            index_price = Mcdex.round_price(message['data']['lastIndex'] if 'data' in message else message['lastIndex'])
+            with self._lock:
+                self._index_price = index_price
+                self._updated_at = time.monotonic()
+        elif kind == 'error':
+            raise Exception(f"mcdex stream error: {message}")
+
+    def _on_disconnect(self):
+        self._streaming = False
+
+    def _poll_once(self) -> float:
+        self.snapshot()
+        return self.snapshot_interval
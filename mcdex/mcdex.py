@@ -1,88 +1,97 @@
   
 from .wallet import Wallet
 
-import requests
 import logging
-import json
+import threading
 import time
-import urllib
-import random
+
+from lib.http_client import HttpClient, http_client
 
 
 class Mcdex:
     logger = logging.getLogger()
 
-    def __init__(self, api_url:str, market_id: str):
+    def __init__(self, api_url:str, market_id: str, http: HttpClient = None, auth_ttl: float = 0):
         self.api_url = api_url
         self.market_id = market_id
         self.wallet = None
+        self._wallet_key = None
         self.timeout = 5
+        # pooled keep-alive connections, order placement is never retried
+        self.http = http if http is not None else http_client
+        # seconds a signed MAI-AUTHENTICATION header is reused, 0 signs one per request
+        self.auth_ttl = auth_ttl
+        self._auth_lock = threading.Lock()
+        self._auth = None
+        self._auth_signed_at = None
 
     def set_wallet(self, private_key: str, public_key: str):
+        if self.wallet is not None and self._wallet_key == (private_key, public_key):
+            return
         self.wallet = Wallet(private_key, public_key)
+        self._wallet_key = (private_key, public_key)
+        with self._auth_lock:
+            self._auth = None
 
     def generate_auth_headers(self, principal=None):
-        timestamp = int(time.time() * 1000)
-        signature = self.wallet.sign_hash(text=f"MAI-AUTHENTICATION@{timestamp}")
-        result = {"Mai-Authentication": f"{self.wallet.address}#MAI-AUTHENTICATION@{timestamp}#{signature}"}
+        result = {"Mai-Authentication": self._authentication()}
         if principal is not None:
             result["Mai-Principal"] = principal
         return result
 
+    def _authentication(self) -> str:
+        with self._auth_lock:
+            now = time.monotonic()
+            if self._auth is None or now - self._auth_signed_at >= self.auth_ttl:
+                timestamp = int(time.time() * 1000)
+                signature = self.wallet.sign_hash(text=f"MAI-AUTHENTICATION@{timestamp}")
+                self._auth = f"{self.wallet.address}#MAI-AUTHENTICATION@{timestamp}#{signature}"
+                self._auth_signed_at = now
+            return self._auth
+
+    @staticmethod
+    def _order_signature(signature: str) -> str:
+        # r, s, v reordered into the order book's v, padding, r, s layout
+        return '0x' + signature[130:] + '0' * 62 + signature[2:130]
+
+    def sign_orders(self, order_ids: list) -> list:
+        return [self._order_signature(signature) for signature in self.wallet.sign_many(order_ids)]
+
     def api_request(self, http_method, url, params=None, headers=None):
-        if http_method.lower() == "get":
-            if headers is None:
-                headers = {"content-type": "application/x-www-form-urlencoded"}
-            else:
-                headers["content-type"] = "application/x-www-form-urlencoded"
-
-            if params is None:
-                params = ""
-            else:
-                params = urllib.parse.urlencode(params)
-            response = requests.get(url, params, timeout=self.timeout, headers=headers)
-            code = response.status_code
-            if code == 200:
-                return response.json()
-            else:
-                return {"status": "fail", "code": code}
-        elif http_method.lower() == "post":
-            if headers is None:
-                headers = {"content-type": "application/json"}
-            else:
-                headers["content-type"] = "application/json"
-
-            if params is not None:
-                params = json.dumps(params)
-            response = requests.post(url, params, timeout=self.timeout, headers=headers)
-            code = response.status_code
-            if code == 200:
-                return response.json()
-            else:
-                return {"status": "fail", "code": code}
-        elif http_method.lower() == "delete":
-            response = requests.delete(url, headers=headers)
-            code = response.status_code
-            if code == 200:
-                return response.json()
-            else:
-                return {"status": "fail", "code": code}
+        http_method = http_method.lower()
+        if http_method == "get":
+            headers = {**(headers or {}), "content-type": "application/x-www-form-urlencoded"}
+            response = self.http.get(url, params=params, headers=headers, timeout=self.timeout)
+        elif http_method == "post":
+            response = self.http.post(url, json=params, headers=headers, timeout=self.timeout)
+        elif http_method == "delete":
+            response = self.http.delete(url, params=params, headers=headers, timeout=self.timeout)
+        else:
+            raise ValueError(f"unsupported http method {http_method}")
+        code = response.status_code
+        if code == 200:
+            return response.json()
+        else:
+            return {"status": "fail", "code": code}
 
     def get_balances(self):
         response_data = self.api_request("get", url=f"{self.api_url}/account/balances", params={"marketID": self.market_id}, headers=self.generate_auth_headers())
-        print(f"[get balances response]{response_data}\n")
+        self.logger.debug(f"get balances response: {response_data}")
+        return response_data
 
     def get_active_orders(self):
         response_data = self.api_request("get", url=f"{self.api_url}/orders", params={"status": "pending"}, headers=self.generate_auth_headers())
-        print(f"[get active orders response]{response_data}\n")
+        self.logger.debug(f"get active orders response: {response_data}")
         return response_data["data"]["orders"]
 
     def get_market_status(self):
         response_data = self.api_request("get", url=f"{self.api_url}/markets/{self.market_id}/status")
-        print(f"[get market status response]{response_data}\n")
-        index_price = response_data["data"]["lastIndex"]
-        index_price = str(float(index_price) // 0.01 * 0.01)
-        return index_price
+        self.logger.debug(f"get market status response: {response_data}")
+        return self.round_price(response_data["data"]["lastIndex"])
+
+    @staticmethod
+    def round_price(index_price) -> str:
+        return str(float(index_price) // 0.01 * 0.01)
 
     def build_unsigned_order(self, amount, price, side, order_type, expires, targetLeverage, isPostOnly=False):
         url = f"{self.api_url}/orders/build"
@@ -98,24 +107,37 @@ class Mcdex:
             "isPostOnly": isPostOnly
         }
         response_data = self.api_request('post', url=url, params=params, headers=headers)
-        print(f"[build order response]{response_data}\n")
+        self.logger.debug(f"build order response: {response_data}")
         return response_data["data"]["order"]
 
+    def submit_order(self, order_id: str, signature: str):
+        params = {"orderID": order_id, "signature": signature, "method": 0}
+        url = f"{self.api_url}/orders"
+        response_data = self.api_request('post', url=url, params=params, headers=self.generate_auth_headers())
+        self.logger.debug(f"place order response: {response_data}")
+        if response_data.get("status") == "fail":
+            raise Exception(f"place order {order_id} status:{response_data.get('code')}")
+        return response_data
+
     def place_order(self, amount, order_type, price, side, expires, leverage):
         unsigned_order = self.build_unsigned_order(amount=amount, price=price, side=side,
                                             order_type=order_type, expires=expires,
                                             targetLeverage=leverage)
         order_id = unsigned_order["id"]
-        signature = self.wallet.sign_hash(hexstr=order_id)
-        signature = '0x' + signature[130:] + '0' * 62 + signature[2:130]
-        params = {"orderID": order_id, "signature": signature, "method": 0}
+        self.submit_order(order_id, self._order_signature(self.wallet.sign_hash(hexstr=order_id)))
+        return unsigned_order
 
-        url = f"{self.api_url}/orders"
-        response_data = self.api_request('post', url=url, params=params, headers=self.generate_auth_headers())
-        print(f"[place order response]{response_data}\n")
+    def cancel_order(self, order_id: str):
+        url = f"{self.api_url}/orders/{order_id}"
+        response_data = self.api_request('delete', url=url, headers=self.generate_auth_headers())
+        self.logger.debug(f"cancel order response: {response_data}")
+        if response_data.get("status") == "fail":
+            raise Exception(f"cancel order {order_id} status:{response_data.get('code')}")
+        return response_data
 
     def cancel_all_orders(self):
         url = f"{self.api_url}/orders"
         response_data = self.api_request('delete', url=url, params={"marketID": self.market_id}, headers=self.generate_auth_headers())
-        print(f"[cancel all orders response]{response_data}\n")
+        self.logger.debug(f"cancel all orders response: {response_data}")
+        return response_data
 
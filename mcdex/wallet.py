@@ -11,6 +11,11 @@ class Wallet:
         signature = signature_dict["signature"].hex()
         return signature
 
+    def sign_many(self, hashes: list) -> list:
+        """Signs many hex strings (order ids) as personal messages with the same key, in order"""
+        msg_hashes = [defunct_hash_message(hexstr=hexstr) for hexstr in hashes]
+        return [signature_dict["signature"].hex() for signature_dict in self._account.signHashes(msg_hashes)]
+
     @property
     def address(self):
-        return self._public_key
\ No newline at end of file
+        return self._public_key
@@ -0,0 +1,167 @@
+import json
+import queue
+import time
+
+from web3 import Web3
+
+from lib.stream import FallbackStream
+
+
+def _to_int(value) -> int:
+    if isinstance(value, str):
+        return int(value, 16)
+    return int(value)
+
+
+def _to_hex(value) -> str:
+    if isinstance(value, str):
+        return value
+    return Web3.toHex(value)
+
+
+class BlockHeader:
+    def __init__(self, number: int, hash: str, parent_hash: str, timestamp: int, received_at: float = None):
+        assert(isinstance(number, int))
+        assert(isinstance(hash, str))
+        assert(isinstance(parent_hash, str))
+
+        self.number = number
+        self.hash = hash
+        self.parent_hash = parent_hash
+        self.timestamp = timestamp
+        # monotonic arrival time, used to measure head-to-dispatch latency
+        self.received_at = received_at if received_at is not None else time.monotonic()
+
+    @classmethod
+    def from_dict(cls, header):
+        """Build from a `newHeads` payload (hex strings) or a web3 block (ints/HexBytes)"""
+        return BlockHeader(number=_to_int(header['number']),
+                           hash=_to_hex(header['hash']),
+                           parent_hash=_to_hex(header['parentHash']),
+                           timestamp=_to_int(header['timestamp']))
+
+    def __repr__(self):
+        return f"BlockHeader(#{self.number} {self.hash})"
+
+
+class HeadSource(FallbackStream):
+    """Delivers new chain heads, pushed by a `newHeads` websocket subscription when available
+    and by adaptive-interval HTTP polling otherwise (or while the socket is down)."""
+    name = "head-source"
+
+    def __init__(self, web3: Web3, ws_url: str = None, min_poll_interval: float = 0.25,
+                 max_poll_interval: float = 2.0, ws_timeout: float = 60, ws_retry_interval: float = 30):
+        assert(isinstance(web3, Web3))
+        assert(0 < min_poll_interval <= max_poll_interval)
+        super().__init__(ws_url, ws_timeout, ws_retry_interval)
+
+        self.web3 = web3
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+
+        self._heads = queue.Queue()
+        self._last_hash = None
+        self._last_polled = None
+        self._block_time = None
+        self._poll_interval = min_poll_interval
+
+    def get(self, timeout: float) -> list:
+        """Returns all queued heads, oldest first; raises `queue.Empty` on timeout"""
+        headers = [self._heads.get(timeout=timeout)]
+        while True:
+            try:
+                headers.append(self._heads.get_nowait())
+            except queue.Empty:
+                return headers
+
+    def _emit(self, header: BlockHeader):
+        if header.hash == self._last_hash:
+            return
+        self._last_hash = header.hash
+        self._heads.put(header)
+
+    async def _subscribe(self, ws):
+        await ws.send(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}))
+        response = json.loads(await ws.recv())
+        if 'result' not in response:
+            raise Exception(f"eth_subscribe failed: {response.get('error')}")
+        self.logger.info(f"Subscribed to newHeads on {self.ws_url}")
+
+    def _on_message(self, message: dict):
+        if message.get('method') == 'eth_subscription':
+            self._emit(BlockHeader.from_dict(message['params']['result']))
+
+    def _on_disconnect(self):
+        self._poll_interval = self.min_poll_interval
+
+    def _poll_once(self) -> float:
+        try:
+            header = BlockHeader.from_dict(self.web3.eth.getBlock('latest'))
+        except Exception as e:
+            self.logger.warning(f"poll latest block error: {e}")
+            return self.max_poll_interval
+
+        if header.hash != self._last_hash:
+            self._update_block_time(header)
+            self._emit(header)
+            # sleep through most of the expected block time, then poll tightly
+            self._poll_interval = self.min_poll_interval
+            wait = self._block_time * 0.8 if self._block_time else self._poll_interval
+            return max(wait, self.min_poll_interval)
+        wait = self._poll_interval
+        self._poll_interval = min(self._poll_interval * 1.5, self.max_poll_interval)
+        return wait
+
+    def _update_block_time(self, header: BlockHeader):
+        last, self._last_polled = self._last_polled, header
+        if last is None or header.number <= last.number or header.timestamp <= last.timestamp:
+            return
+        gap = (header.timestamp - last.timestamp) / (header.number - last.number)
+        self._block_time = gap if self._block_time is None else self._block_time * 0.8 + gap * 0.2
+
+
+class HeaderBuffer:
+    """Fixed-size ring of the most recent canonical headers, indexed by block number"""
+
+    def __init__(self, size: int = 128):
+        assert(size > 1)
+
+        self.size = size
+        self._headers = [None] * size
+        self.head = None
+
+    def get(self, number: int) -> BlockHeader:
+        header = self._headers[number % self.size]
+        if header is None or header.number != number or self.head is None or number > self.head.number:
+            return None
+        return header
+
+    def contains(self, header: BlockHeader) -> bool:
+        stored = self.get(header.number)
+        return stored is not None and stored.hash == header.hash
+
+    def links(self, header: BlockHeader) -> bool:
+        """True when the parent of `header` is known, or lies beyond what the buffer can tell"""
+        if self.head is None or header.number - 1 > self.head.number:
+            return self.head is None
+        parent = self.get(header.number - 1)
+        if parent is None:
+            return header.number - 1 <= self.head.number - self.size
+        return parent.hash == header.parent_hash
+
+    def append(self, header: BlockHeader) -> int:
+        """Makes `header` the new head, returns how many previous canonical blocks it orphaned"""
+        depth = 0
+        if self.head is not None:
+            if self.links(header):
+                depth = max(0, self.head.number - (header.number - 1))
+            elif header.number > self.head.number + 1:
+                # a gap past the head orphans nothing the buffer can tell, start over from `header`
+                self._headers = [None] * self.size
+            else:
+                # no common ancestor inside the buffer, everything we know is suspect
+                depth = min(self.size, self.head.number - header.number + 1)
+                self._headers = [None] * self.size
+        self._headers[header.number % self.size] = header
+        self.head = header
+        return depth
@@ -1,16 +1,33 @@
+import heapq
 import logging
+import queue
 import signal
 import threading
 import time
 
 from web3 import Web3
 
+from lib import metrics
+from .head import BlockHeader, HeadSource, HeaderBuffer
+
 class Watcher:
     logger = logging.getLogger()
 
-    def __init__(self, web3: Web3 = None):
+    # heads older than this (seconds) come from a node that is still catching up
+    MAX_HEAD_AGE = 120
+
+    def __init__(self, web3: Web3 = None, ws_url: str = None, min_poll_interval: float = 0.25, max_poll_interval: float = 2.0,
+                 block_cache=None, workers: int = 4, header_buffer_size: int = 128):
         self.web3 = web3
-        self.block_syncers = []
+        self.ws_url = ws_url
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        # optional lib.contract.BlockCache, syncer threads are pinned to the head they handle
+        self.block_cache = block_cache
+        self.scheduler = Scheduler(workers, on_start=self._on_syncer_start, on_finish=self._on_syncer_finish)
+        self.headers = HeaderBuffer(header_buffer_size)
+        self.head_callbacks = []
+        self.reorg_callbacks = []
 
         self.terminated = False
         self._last_block_time = None
@@ -42,10 +59,26 @@ class Watcher:
             while self.web3.eth.syncing:
                 time.sleep(0.25)
 
-    def add_block_syncer(self, callback):
+    def add_block_syncer(self, callback, priority: int = 0, deadline: float = None):
+        """Runs `callback` on new blocks, lower `priority` runs first and a queued run is
+        dropped once it has waited `deadline` seconds since its head arrived"""
         assert(callable(callback))
         assert(self.web3 is not None)
-        self.block_syncers.append(AsyncThread(callback))
+        self.scheduler.add(BlockSyncer(callback, priority, deadline))
+
+    def add_head_callback(self, callback):
+        """Calls `callback(header)` on the watcher thread for every new head, it must not block"""
+        assert(callable(callback))
+        self.head_callbacks.append(callback)
+
+    def add_reorg_callback(self, callback):
+        """Calls `callback(depth, header)` when `header` orphans the last `depth` canonical blocks"""
+        assert(callable(callback))
+        self.reorg_callbacks.append(callback)
+
+    def is_stale(self) -> bool:
+        """True when called from a syncer whose block is no longer the newest head"""
+        return self.scheduler.is_stale()
 
     def set_terminated(self):
         self.terminated = True
@@ -55,7 +88,9 @@ class Watcher:
         signal.signal(signal.SIGTERM, self._sigal_handler)
 
         self.logger.info("Watching for new blocks")
-        event_filter = self.web3.eth.filter('latest')
+        head_source = HeadSource(self.web3, self.ws_url, self.min_poll_interval, self.max_poll_interval)
+        head_source.start()
+        self.scheduler.start()
         while True:
             if self.terminated:
                 break
@@ -64,42 +99,85 @@ class Watcher:
                 if not self.web3.eth.syncing:
                     self.logger.fatal("No new blocks received for 300 seconds, the keeper will terminate")
                     break
-            
-            for event in event_filter.get_new_entries():
-                self._sync_block(event)
-            time.sleep(1)
 
-        for block_syncer in self.block_syncers:
-            block_syncer.wait()
+            try:
+                headers = head_source.get(timeout=1)
+            except queue.Empty:
+                continue
+            for header in headers[:-1]:
+                self.logger.debug(f"Ignoring block #{header.number} ({header.hash}),"
+                                  f" as there is already block #{headers[-1].number} available")
+                self._track_header(header)
+            self._sync_block(headers[-1])
+
+        head_source.stop()
+        self.scheduler.stop()
 
 
-    def _sync_block(self, block_hash):
+    def _sync_block(self, header: BlockHeader):
         self._last_block_time = int(time.time())
-        block = self.web3.eth.getBlock(block_hash)
-        block_number = block['number']
-        if self.web3.eth.syncing:
+        block_number = header.number
+        block_hash = header.hash
+        if int(time.time()) - header.timestamp > self.MAX_HEAD_AGE:
             self.logger.info(f"the node is syncing, new block #{block_number} ({block_hash}) ignored ")
-            return 
-        
-        max_block_number = self.web3.eth.blockNumber
-        if block_number != max_block_number:
-            self.logger.debug(f"Ignoring block #{block_number} ({block_hash}),"
-                                    f" as there is already block #{max_block_number} available")
             return
 
         if self.terminated:
             self.logger.debug(f"Ignoring block #{block_number} as keeper is already terminating")
 
-        def on_start():
-            self.logger.debug(f"Processing the syncer")
+        if not self._track_header(header):
+            self.logger.debug(f"Ignoring block #{block_number} ({block_hash}), already processed")
+            return
+
+        if self.block_cache is not None:
+            self.block_cache.new_block(block_number)
+        for callback in self.head_callbacks:
+            try:
+                callback(header)
+            except Exception as e:
+                self.logger.fatal(f"head callback failed: {e}")
 
-        def on_finish():
-            self.logger.debug(f"Finished processing the syncer")
-        for block_syncer in self.block_syncers:
-            if not block_syncer.run(on_start, on_finish):
-                self.logger.debug(f"Ignoring block #{block_number} ({block_hash}),"
-                                    f" as previous callback is still running")
-                
+        self.scheduler.dispatch(block_number, header.received_at)
+        self.logger.debug(f"syncer runs {self.scheduler.counters}")
+
+        lag = time.monotonic() - header.received_at
+        metrics.head_dispatch_lag.observe(lag)
+        self.logger.debug(f"block #{block_number} dispatched {lag * 1000:.1f}ms after arrival")
+
+    def _track_header(self, header: BlockHeader) -> bool:
+        """Records `header` in the header buffer and reports reorgs, False if it was already known"""
+        if self.headers.contains(header):
+            return False
+        depth = self._append_header(header)
+        if depth > 0:
+            self.logger.warning(f"chain reorg of depth {depth} at block #{header.number} ({header.hash})")
+            for callback in self.reorg_callbacks:
+                try:
+                    callback(depth, header)
+                except Exception as e:
+                    self.logger.fatal(f"reorg callback failed: {e}")
+        return True
+
+    def _append_header(self, header: BlockHeader) -> int:
+        # fetch the new side of a fork until the chain links up, a gap past the head is not filled in
+        chain = [header]
+        while not self.headers.links(chain[-1]) and chain[-1].number - 1 <= self.headers.head.number \
+                and len(chain) < self.headers.size:
+            chain.append(BlockHeader.from_dict(self.web3.eth.getBlock(chain[-1].parent_hash)))
+        depth = 0
+        for ancestor in reversed(chain):
+            depth += self.headers.append(ancestor)
+        return depth
+
+    def _on_syncer_start(self, block_number: int):
+        if self.block_cache is not None:
+            self.block_cache.pin(block_number)
+        self.logger.debug(f"Processing the syncer for block #{block_number}")
+
+    def _on_syncer_finish(self, block_number: int):
+        if self.block_cache is not None:
+            self.block_cache.unpin()
+        self.logger.debug(f"Finished processing the syncer for block #{block_number}")
 
     def _sigal_handler(self, sig, frame):
         if self.terminated:
@@ -108,27 +186,150 @@ class Watcher:
             self.logger.warning("Keeper received SIGINT/SIGTERM signal, will terminate gracefully")
             self.terminated = True
 
-class AsyncThread:
-    def __init__(self, callback):
+class BlockSyncer:
+    def __init__(self, callback, priority: int = 0, deadline: float = None):
+        assert(callable(callback))
+        assert(deadline is None or deadline > 0)
+
         self.callback = callback
-        self.thread = None
-
-    def run(self, on_start=None, on_finish=None) -> bool:
-        #ensure the same block_syncer only one thread running at the same time
-        if self.thread is None or not self.thread.is_alive():
-            def thread_target():
-                if on_start is not None:
-                    on_start()
-                self.callback()
-                if on_finish is not None:
-                    on_finish()
-
-            self.thread = threading.Thread(target=thread_target)
-            self.thread.start()
-            return True
-        else:
-            return False
+        self.priority = priority
+        self.deadline = deadline
+        self.running = False
+        # run queued while the syncer is busy or waiting for a worker
+        self.pending = None
+
+    @property
+    def name(self):
+        return getattr(self.callback, '__name__', repr(self.callback))
+
+
+class SyncerRun:
+    def __init__(self, syncer: BlockSyncer, block_number: int, received_at: float):
+        self.syncer = syncer
+        self.block_number = block_number
+        self.received_at = received_at
+        self.queued = False
+
+    def expired(self) -> bool:
+        return self.syncer.deadline is not None and time.monotonic() - self.received_at > self.syncer.deadline
+
+
+class Scheduler:
+    """Runs block syncers on a fixed pool of worker threads.
+
+    A syncer never runs twice at the same time. A new head arriving while a syncer is busy or
+    still waiting for a worker retargets its queued run to the newest block instead of dropping
+    it, and queued runs past their deadline are cancelled before they start."""
+    logger = logging.getLogger()
+
+    def __init__(self, workers: int = 4, on_start=None, on_finish=None):
+        assert(workers > 0)
+
+        self.workers = workers
+        self.on_start = on_start
+        self.on_finish = on_finish
+        self.syncers = []
+        self.counters = {'dispatched': 0, 'coalesced': 0, 'overrun': 0, 'expired': 0}
+
+        self._condition = threading.Condition()
+        self._queue = []
+        self._sequence = 0
+        self._threads = []
+        self._stopped = False
+        self._latest_block = None
+        self._local = threading.local()
+
+    def add(self, syncer: BlockSyncer):
+        assert(isinstance(syncer, BlockSyncer))
+        with self._condition:
+            self.syncers.append(syncer)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"syncer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._queue = []
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def dispatch(self, block_number: int, received_at: float = None):
+        received_at = received_at if received_at is not None else time.monotonic()
+        with self._condition:
+            self._latest_block = block_number
+            for syncer in self.syncers:
+                if syncer.running:
+                    self._count('overrun')
+                if syncer.pending is not None:
+                    # keep its place in the queue, only move it to the newest head
+                    syncer.pending.block_number = block_number
+                    syncer.pending.received_at = received_at
+                    self._count('coalesced')
+                    continue
+
+                syncer.pending = SyncerRun(syncer, block_number, received_at)
+                if not syncer.running:
+                    self._enqueue(syncer.pending)
+            self._condition.notify_all()
+
+    def is_stale(self) -> bool:
+        run = getattr(self._local, 'run', None)
+        return run is not None and self._latest_block is not None and run.block_number < self._latest_block
+
+    def _count(self, result: str):
+        self.counters[result] += 1
+        metrics.syncer_runs.inc(result)
+
+    def _enqueue(self, run: SyncerRun):
+        run.queued = True
+        self._sequence += 1
+        heapq.heappush(self._queue, (run.syncer.priority, self._sequence, run))
+
+    def _next(self):
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                while self._queue:
+                    _, _, run = heapq.heappop(self._queue)
+                    run.syncer.pending = None
+                    if run.expired():
+                        self._count('expired')
+                        self.logger.debug(f"Cancelled {run.syncer.name} for block #{run.block_number}, deadline passed")
+                        continue
+                    run.syncer.running = True
+                    self._count('dispatched')
+                    return run
+                self._condition.wait()
+
+    def _work(self):
+        while True:
+            run = self._next()
+            if run is None:
+                return
 
-    def wait(self):
-        if self.thread is not None:
-            self.thread.join()
+            self._local.run = run
+            started_at = time.monotonic()
+            rpc_calls = metrics.thread_rpc_calls()
+            try:
+                if self.on_start is not None:
+                    self.on_start(run.block_number)
+                run.syncer.callback()
+            except Exception as e:
+                self.logger.fatal(f"syncer {run.syncer.name} failed on block #{run.block_number}: {e}")
+            finally:
+                metrics.syncer_duration.observe(time.monotonic() - started_at, run.syncer.name)
+                metrics.syncer_rpc_calls.observe(metrics.thread_rpc_calls() - rpc_calls, run.syncer.name)
+                if self.on_finish is not None:
+                    self.on_finish(run.block_number)
+                self._local.run = None
+                with self._condition:
+                    run.syncer.running = False
+                    if run.syncer.pending is not None and not run.syncer.pending.queued and not self._stopped:
+                        self._enqueue(run.syncer.pending)
+                        self._condition.notify()